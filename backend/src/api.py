@@ -1,8 +1,9 @@
 # src/api.py
 from __future__ import annotations
 
-from threading import Timer
-from typing import Any
+from threading import Event, Thread, Timer
+from types import MappingProxyType
+from typing import Any, Mapping
 
 from app_info import APP_REPO_URL, APP_VERSION
 from storage import (
@@ -11,21 +12,61 @@ from storage import (
     get_app_setting,
     get_prompt_library,
     init_db,
-    list_chat_sessions,
-    list_settings,
+    iter_chat_sessions,
+    iter_settings,
     save_settings,
     set_prompt_library,
     set_app_setting,
     upsert_chat_session,
     delete_chat_session as delete_chat_session_record,
 )
-from schemas import AppSettingsPayload
+
+# Read-only templates; each call hands out a fresh copy so a caller that
+# mutates its response cannot change later ones.
+_APP_STATUS: Mapping[str, Any] = MappingProxyType(
+    {
+        "status": "online",
+        "version": APP_VERSION,
+        "message": "后端已就绪！",
+    }
+)
+
+_APP_INFO: Mapping[str, Any] = MappingProxyType(
+    {
+        "version": APP_VERSION,
+        "repoUrl": APP_REPO_URL,
+    }
+)
+
+_AVAILABLE_MODELS: tuple[Mapping[str, str], ...] = (
+    MappingProxyType({"id": "dalle3", "name": "DALL-E 3", "provider": "OpenAI"}),
+    MappingProxyType({"id": "flux-pro", "name": "Flux Pro", "provider": "Replicate"}),
+    MappingProxyType(
+        {"id": "sdxl", "name": "Stable Diffusion XL", "provider": "Stability AI"}
+    ),
+)
 
 
 class ProApi:
     def __init__(self):
         self._window = None
-        init_db()
+        self._default_save_dir_cache: tuple[bool, str | None] = (False, None)
+        self._db_ready = Event()
+        self._db_error: Exception | None = None
+        Thread(target=self._init_db, name="paraimage-init-db", daemon=True).start()
+
+    def _init_db(self) -> None:
+        try:
+            init_db()
+        except Exception as exc:
+            self._db_error = exc
+        finally:
+            self._db_ready.set()
+
+    def _wait_for_db(self) -> None:
+        self._db_ready.wait()
+        if self._db_error is not None:
+            raise RuntimeError("database initialization failed") from self._db_error
 
     def set_window(self, window):
         self._window = window
@@ -42,25 +83,14 @@ class ProApi:
 
     # 供前端调用的测试接口
     def get_app_status(self):
-        return {
-            "status": "online",
-            "version": APP_VERSION,
-            "message": "后端已就绪！",
-        }
+        return dict(_APP_STATUS)
 
     def get_app_info(self) -> dict[str, Any]:
-        return {
-            "version": APP_VERSION,
-            "repoUrl": APP_REPO_URL,
-        }
+        return dict(_APP_INFO)
 
     # 模拟获取支持的模型列表
     def get_available_models(self):
-        return [
-            {"id": "dalle3", "name": "DALL-E 3", "provider": "OpenAI"},
-            {"id": "flux-pro", "name": "Flux Pro", "provider": "Replicate"},
-            {"id": "sdxl", "name": "Stable Diffusion XL", "provider": "Stability AI"},
-        ]
+        return [dict(model) for model in _AVAILABLE_MODELS]
 
     def _config_to_dict(self, record: Settings) -> dict[str, Any]:
         return {
@@ -96,21 +126,25 @@ class ProApi:
         if not provider_name:
             return {"ok": False, "error": "provider is required"}
 
+        self._wait_for_db()
         record = save_settings(
             provider_name, api_key, base_url, normalized_model_ids
         )
         return {"ok": True, "config": self._config_to_dict(record)}
 
     def get_configs(self) -> list[dict[str, Any]]:
-        records = list_settings()
-        return [self._config_to_dict(record) for record in records]
+        self._wait_for_db()
+        return [self._config_to_dict(record) for record in iter_settings()]
 
     def get_chat_sessions(self, model_id: str) -> list[dict[str, Any]]:
         model_id = (model_id or "").strip()
         if not model_id:
             return []
-        records = list_chat_sessions(model_id)
-        return [self._session_to_dict(record) for record in records]
+        self._wait_for_db()
+        return [
+            self._session_to_dict(record)
+            for record in iter_chat_sessions(model_id)
+        ]
 
     def save_chat_session(self, payload: dict[str, Any]) -> dict[str, Any]:
         session_id = (payload.get("id") or "").strip()
@@ -124,6 +158,7 @@ class ProApi:
         if not isinstance(messages, list):
             return {"ok": False, "error": "messages must be a list"}
 
+        self._wait_for_db()
         record = upsert_chat_session(session_id, model_id, title, messages)
         return {"ok": True, "session": self._session_to_dict(record)}
 
@@ -131,17 +166,20 @@ class ProApi:
         session_id = (session_id or "").strip()
         if not session_id:
             return {"ok": False, "error": "session id is required"}
+        self._wait_for_db()
         deleted = delete_chat_session_record(session_id)
         return {"ok": deleted, "deleted": deleted, "id": session_id}
 
     def generate_image(self, payload: dict[str, Any]) -> dict[str, Any]:
         from services.generation import generate_single
 
+        self._wait_for_db()
         return generate_single(payload)
 
     def generate_batch(self, payload: dict[str, Any]) -> dict[str, Any]:
         from services.generation import generate_batch
 
+        self._wait_for_db()
         return generate_batch(payload)
 
     def process_images(self, payload: dict[str, Any]) -> dict[str, Any]:
@@ -152,24 +190,39 @@ class ProApi:
     def save_images(self, payload: dict[str, Any]) -> dict[str, Any]:
         from services.image_saving import save_images
 
-        return save_images(payload, window=self._window)
+        self._wait_for_db()
+        response = save_images(payload, window=self._window)
+        # Saving may persist a newly picked default directory.
+        self._default_save_dir_cache = (False, None)
+        return response
 
     def get_app_settings(self) -> dict[str, Any]:
-        default_save_dir = get_app_setting("default_save_dir")
-        return {"defaultSaveDir": default_save_dir.value if default_save_dir else None}
+        loaded, cached = self._default_save_dir_cache
+        if not loaded:
+            self._wait_for_db()
+            default_save_dir = get_app_setting("default_save_dir")
+            cached = default_save_dir.value if default_save_dir else None
+            self._default_save_dir_cache = (True, cached)
+        return {"defaultSaveDir": cached}
 
     def save_app_settings(self, payload: dict[str, Any]) -> dict[str, Any]:
-        try:
-            request = AppSettingsPayload.model_validate(payload)
-        except Exception as exc:
-            return {"ok": False, "error": str(exc)}
-        if request.default_save_dir is None:
-            set_app_setting("default_save_dir", "")
+        # Mirrors AppSettingsPayload without a pydantic round-trip per save.
+        if not isinstance(payload, dict):
+            return {"ok": False, "error": "payload must be an object"}
+        # The alias wins whenever it is present, even as null.
+        if "defaultSaveDir" in payload:
+            default_save_dir = payload["defaultSaveDir"]
         else:
-            set_app_setting("default_save_dir", request.default_save_dir)
+            default_save_dir = payload.get("default_save_dir")
+        if default_save_dir is not None and not isinstance(default_save_dir, str):
+            return {"ok": False, "error": "defaultSaveDir must be a string"}
+        stored_value = "" if default_save_dir is None else default_save_dir
+        self._wait_for_db()
+        set_app_setting("default_save_dir", stored_value)
+        self._default_save_dir_cache = (True, stored_value)
         return {
             "ok": True,
-            "defaultSaveDir": request.default_save_dir,
+            "defaultSaveDir": default_save_dir,
         }
 
     def choose_save_directory(self) -> dict[str, Any]:
@@ -178,12 +231,14 @@ class ProApi:
         return choose_save_directory(window=self._window)
 
     def get_prompt_library(self) -> dict[str, Any]:
+        self._wait_for_db()
         return {"prompts": get_prompt_library()}
 
     def save_prompt_library(self, payload: dict[str, Any]) -> dict[str, Any]:
         prompts = payload.get("prompts") if isinstance(payload, dict) else payload
         if not isinstance(prompts, list):
             return {"ok": False, "error": "prompts must be a list"}
+        self._wait_for_db()
         set_prompt_library(prompts)
         return {"ok": True, "prompts": prompts}
 
@@ -14,6 +14,31 @@ def get_resource_path(*parts: str) -> Path:
     return Path(__file__).resolve().parent.parent.parent.joinpath(*parts)
 
 
+def _create_window_accepts_icon() -> bool:
+    code = getattr(webview.create_window, "__code__", None)
+    if code is not None:
+        arg_count = code.co_argcount + code.co_kwonlyargcount
+        return "icon" in code.co_varnames[:arg_count]
+    try:
+        return "icon" in inspect.signature(webview.create_window).parameters
+    except (TypeError, ValueError):
+        return False
+
+
+_CREATE_WINDOW_ACCEPTS_ICON = _create_window_accepts_icon()
+
+
+def _on_webview_ready() -> None:
+    log_startup("webview_ready")
+    # Imported here, off the first-paint path. Official Pillow wheels bundle
+    # libjpeg-turbo; record it for slow-split reports.
+    from PIL import features as pil_features
+
+    log_startup(
+        f"pillow_libjpeg_turbo={pil_features.check_feature('libjpeg_turbo')}"
+    )
+
+
 def main():
     launch_startup_terminal()
     log_startup("main_enter")
@@ -39,17 +64,13 @@ def main():
         "min_size": (1420, 890),
         "background_color": "#ffffff",
     }
-    if icon_path.exists():
-        try:
-            if "icon" in inspect.signature(webview.create_window).parameters:
-                window_kwargs["icon"] = str(icon_path)
-        except (TypeError, ValueError):
-            pass
+    if _CREATE_WINDOW_ACCEPTS_ICON and icon_path.exists():
+        window_kwargs["icon"] = str(icon_path)
     window = webview.create_window(**window_kwargs)
     log_startup("window_created")
     
     api.set_window(window)
-    webview.start(func=lambda: log_startup("webview_ready"), debug=debug)
+    webview.start(func=_on_webview_ready, debug=debug)
 
 if __name__ == '__main__':
     main()
@@ -1,12 +1,19 @@
 from __future__ import annotations
 
-import base64
+import bisect
 import math
+from functools import lru_cache
 from typing import Sequence
 
 from openai import OpenAI
 
-from utils import debug_log, resolve_openai_base_url
+from utils import (
+    as_dict,
+    b64_image_to_url,
+    debug_log,
+    image_bytes_to_url,
+    resolve_openai_base_url,
+)
 
 SUPPORTED_ASPECT_RATIOS = {
     "1:1": 1.0,
@@ -20,9 +27,36 @@ SUPPORTED_ASPECT_RATIOS = {
     "16:9": 16 / 9,
     "21:9": 21 / 9,
 }
+_ASPECT_RATIOS_BY_VALUE: tuple[tuple[float, str], ...] = tuple(
+    sorted((value, name) for name, value in SUPPORTED_ASPECT_RATIOS.items())
+)
+_ASPECT_RATIO_VALUES: tuple[float, ...] = tuple(
+    value for value, _ in _ASPECT_RATIOS_BY_VALUE
+)
 
 
+@lru_cache(maxsize=16)
+def _get_client(api_key: str, api_base: str) -> OpenAI:
+    return OpenAI(api_key=api_key, base_url=api_base)
+
+
+def _closest_aspect_ratio(ratio_value: float) -> str:
+    index = bisect.bisect_left(_ASPECT_RATIO_VALUES, ratio_value)
+    if index == 0:
+        return _ASPECT_RATIOS_BY_VALUE[0][1]
+    if index == len(_ASPECT_RATIO_VALUES):
+        return _ASPECT_RATIOS_BY_VALUE[-1][1]
+    lower_value, lower_name = _ASPECT_RATIOS_BY_VALUE[index - 1]
+    upper_value, upper_name = _ASPECT_RATIOS_BY_VALUE[index]
+    if ratio_value - lower_value <= upper_value - ratio_value:
+        return lower_name
+    return upper_name
+
+
+@lru_cache(maxsize=64)
 def _resolve_aspect_ratio(size: str | None) -> str | None:
+    if type(size) is str and size in SUPPORTED_ASPECT_RATIOS:
+        return size
     if not size:
         return None
     value = str(size).strip().lower()
@@ -43,60 +77,38 @@ def _resolve_aspect_ratio(size: str | None) -> str | None:
         ratio = f"{width // math.gcd(width, height)}:{height // math.gcd(width, height)}"
         if ratio in SUPPORTED_ASPECT_RATIOS:
             return ratio
-        ratio_value = width / height
-        closest = min(
-            SUPPORTED_ASPECT_RATIOS.items(),
-            key=lambda item: abs(item[1] - ratio_value),
-        )
-        return closest[0]
+        return _closest_aspect_ratio(width / height)
     if value.isdigit():
         return "1:1"
     return None
 
 
 def _extract_image_from_response(response: object) -> tuple[str | None, str | None]:
-    choices = None
-    if isinstance(response, dict):
-        choices = response.get("choices")
-    else:
-        choices = getattr(response, "choices", None)
+    choices = as_dict(response).get("choices")
     if not choices:
         return None, "no choices returned"
 
-    first = choices[0]
-    message = first.get("message") if isinstance(first, dict) else getattr(first, "message", None)
+    message = as_dict(choices[0]).get("message")
     if not message:
         return None, "no message returned"
 
-    parts = None
-    if isinstance(message, dict):
-        parts = message.get("multi_mod_content") or message.get("content")
-    else:
-        parts = getattr(message, "multi_mod_content", None)
-        if parts is None:
-            parts = getattr(message, "content", None)
-
+    message = as_dict(message)
+    parts = message.get("multi_mod_content") or message.get("content")
     if not parts or not isinstance(parts, list):
         return None, "no multimodal content returned"
 
     for part in parts:
-        inline = part.get("inline_data") if isinstance(part, dict) else getattr(part, "inline_data", None)
+        inline = as_dict(part).get("inline_data")
         if not inline:
             continue
-        if isinstance(inline, dict):
-            data = inline.get("data")
-            mime_type = inline.get("mime_type") or "image/png"
-        else:
-            data = getattr(inline, "data", None)
-            mime_type = getattr(inline, "mime_type", None) or "image/png"
+        inline = as_dict(inline)
+        data = inline.get("data")
+        mime_type = inline.get("mime_type") or "image/png"
         if not data:
             continue
-        encoded = (
-            base64.b64encode(data).decode("ascii")
-            if isinstance(data, (bytes, bytearray))
-            else str(data)
-        )
-        return f"data:{mime_type};base64,{encoded}", None
+        if isinstance(data, (bytes, bytearray)):
+            return image_bytes_to_url(data, mime_type), None
+        return b64_image_to_url(data, mime_type), None
 
     return None, "no image data returned"
 
@@ -114,13 +126,17 @@ def generate_image(
         return None, "api key is required"
 
     api_base = resolve_openai_base_url(base_url) or base_url
-    client = OpenAI(api_key=api_key, base_url=api_base)
+    client = _get_client(api_key, api_base)
 
     aspect_ratio = _resolve_aspect_ratio(size) or "1:1"
-    user_content: list[dict[str, object]] = [{"type": "text", "text": prompt}]
-    for ref in references:
-        if ref:
-            user_content.append({"type": "image_url", "image_url": {"url": ref}})
+    user_content: list[dict[str, object]] = [
+        {"type": "text", "text": prompt},
+        *(
+            {"type": "image_url", "image_url": {"url": ref}}
+            for ref in references
+            if ref
+        ),
+    ]
 
     payload: dict[str, object] = {
         "model": model_id,
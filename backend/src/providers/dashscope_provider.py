@@ -1,39 +1,53 @@
 from __future__ import annotations
 
-from typing import Sequence
+import re
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Any, Sequence
 
-from utils import debug_log, normalize_base_url
+from utils import as_dict, debug_log, normalize_base_url
+
+# "W*H" / "WxH" sides take what int() takes (sign, "_" separators); a bare
+# side is plain digits.
+_DASHSCOPE_SIZE_PATTERN = re.compile(
+    r"\s*(?:([+-]?\d+(?:_\d+)*)\s*[xX*]\s*([+-]?\d+(?:_\d+)*)|(\d+))\s*"
+)
+
+_BASE_PAYLOAD = MappingProxyType(
+    {
+        "result_format": "message",
+        "stream": False,
+        "n": 1,
+        "watermark": False,
+        "prompt_extend": True,
+        "negative_prompt": "",
+    }
+)
+
+
+@lru_cache(maxsize=1)
+def _load_sdk() -> tuple[Any, Any]:
+    # Imported on first use; later calls return the cached modules.
+    import dashscope
+    from dashscope import MultiModalConversation
+
+    return dashscope, MultiModalConversation
 
 
 def _resolve_dashscope_size(size: str | None) -> str | None:
     if not size:
         return None
-    value = str(size).strip().lower()
-    if not value:
+    match = _DASHSCOPE_SIZE_PATTERN.fullmatch(str(size))
+    if not match:
+        return None
+    width_text, height_text, side_text = match.groups()
+    if side_text is not None:
+        side = int(side_text)
+        return f"{side}*{side}"
+    width, height = int(width_text), int(height_text)
+    if width <= 0 or height <= 0:
         return None
-    if "*" in value:
-        parts = value.split("*", 1)
-        try:
-            width = int(parts[0])
-            height = int(parts[1])
-        except (TypeError, ValueError):
-            return None
-        if width <= 0 or height <= 0:
-            return None
-        return f"{width}*{height}"
-    if "x" in value:
-        parts = value.split("x", 1)
-        try:
-            width = int(parts[0])
-            height = int(parts[1])
-        except (TypeError, ValueError):
-            return None
-        if width <= 0 or height <= 0:
-            return None
-        return f"{width}*{height}"
-    if value.isdigit():
-        return f"{int(value)}*{int(value)}"
-    return None
+    return f"{width}*{height}"
 
 
 def _normalize_dashscope_base_url(base_url: str) -> str:
@@ -47,32 +61,31 @@ def _normalize_dashscope_base_url(base_url: str) -> str:
 
 
 def _extract_image_from_response(response: object) -> tuple[str | None, str | None]:
-    output = response.get("output") if isinstance(response, dict) else getattr(response, "output", None)
+    output = as_dict(response).get("output")
     if not output:
         return None, "no output returned"
 
-    results = output.get("results") if isinstance(output, dict) else getattr(output, "results", None)
+    output = as_dict(output)
+    results = output.get("results")
     if results and isinstance(results, list):
-        first = results[0]
-        image_url = first.get("url") if isinstance(first, dict) else getattr(first, "url", None)
+        image_url = as_dict(results[0]).get("url")
         if image_url:
             return image_url, None
 
-    choices = output.get("choices") if isinstance(output, dict) else getattr(output, "choices", None)
+    choices = output.get("choices")
     if not choices:
         return None, "no choices returned"
 
-    first = choices[0]
-    message = first.get("message") if isinstance(first, dict) else getattr(first, "message", None)
+    message = as_dict(choices[0]).get("message")
     if not message:
         return None, "no message returned"
 
-    content = message.get("content") if isinstance(message, dict) else getattr(message, "content", None)
+    content = as_dict(message).get("content")
     if not content or not isinstance(content, list):
         return None, "no content returned"
 
     for item in content:
-        image_url = item.get("image") if isinstance(item, dict) else getattr(item, "image", None)
+        image_url = as_dict(item).get("image")
         if image_url:
             return image_url, None
 
@@ -96,8 +109,7 @@ def generate_image(
         return None, "qwen image prompt is required"
 
     try:
-        import dashscope
-        from dashscope import MultiModalConversation
+        dashscope, MultiModalConversation = _load_sdk()
     except Exception as exc:
         return None, f"dashscope sdk not available: {exc}"
 
@@ -117,21 +129,14 @@ def generate_image(
         if input_images:
             return None, "qwen image models without edit do not accept reference images"
 
-    content: list[dict[str, str]] = []
-    if is_edit_model:
-        content.extend({"image": image} for image in input_images)
-    content.append({"text": prompt})
+    # Non-edit models were rejected above if they carried references.
+    content = [*({"image": image} for image in input_images), {"text": prompt}]
 
     payload: dict[str, object] = {
+        **_BASE_PAYLOAD,
         "api_key": api_key,
         "model": model_id,
         "messages": [{"role": "user", "content": content}],
-        "result_format": "message",
-        "stream": False,
-        "n": 1,
-        "watermark": False,
-        "prompt_extend": True,
-        "negative_prompt": "",
     }
 
     size_value = _resolve_dashscope_size(size)
@@ -159,10 +164,11 @@ def generate_image(
         )
         return None, f"request failed: {exc}"
 
-    status_code = response.get("status_code") if isinstance(response, dict) else getattr(response, "status_code", None)
+    response = as_dict(response)
+    status_code = response.get("status_code")
     if status_code != 200:
-        code = response.get("code") if isinstance(response, dict) else getattr(response, "code", None)
-        message = response.get("message") if isinstance(response, dict) else getattr(response, "message", None)
+        code = response.get("code")
+        message = response.get("message")
         detail = f"{code}: {message}" if code or message else "request failed"
         return None, f"dashscope error ({status_code}): {detail}"
 
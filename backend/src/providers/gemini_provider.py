@@ -1,50 +1,69 @@
 from __future__ import annotations
 
-import base64
+import re
+from functools import lru_cache
 from typing import Sequence
 
+import pybase64
 from google import genai
 from google.genai import types
 
-from utils import debug_log
+from utils import debug_log, image_bytes_to_url
+
+_DATA_URL_PATTERN = re.compile(r"data:([^;,]*)(?:;[^,]*)?,(.+)", re.DOTALL)
+
+
+@lru_cache(maxsize=16)
+def _get_client(api_key: str) -> genai.Client:
+    return genai.Client(api_key=api_key)
 
 
 def _parse_data_url(data_url: str) -> tuple[bytes, str] | None:
-    if not data_url.startswith("data:"):
-        return None
-    header, _, payload = data_url.partition(",")
-    if not payload:
+    match = _DATA_URL_PATTERN.match(data_url)
+    if not match:
         return None
-    mime = header[5:]
-    if ";" in mime:
-        mime = mime.split(";", 1)[0]
-    if not mime:
-        mime = "application/octet-stream"
+    mime = match.group(1) or "application/octet-stream"
     try:
-        data = base64.b64decode(payload)
+        data = pybase64.b64decode(match.group(2), validate=False)
     except Exception:
         return None
     return data, mime
 
 
-def generate_image(
+def parse_reference_images(
+    references: Sequence[str],
+) -> tuple[tuple[tuple[bytes, str], ...] | None, str | None]:
+    parsed_references: list[tuple[bytes, str]] = []
+    for ref in references:
+        parsed = _parse_data_url(ref)
+        if not parsed:
+            return None, "unsupported reference image format"
+        parsed_references.append(parsed)
+    return tuple(parsed_references), None
+
+
+def generate_image_bytes(
     *,
     model_id: str,
     prompt: str,
     api_key: str,
     references: Sequence[str],
-) -> tuple[str | None, str | None]:
+    parsed_references: Sequence[tuple[bytes, str]] | None = None,
+) -> tuple[tuple[bytes, str] | None, str | None]:
     if not api_key:
         return None, "api key is required"
 
-    client = genai.Client(api_key=api_key)
+    if parsed_references is None:
+        parsed_references, error = parse_reference_images(references)
+        if error or parsed_references is None:
+            return None, error
+
+    client = _get_client(api_key)
     parts: list[types.Part] = [types.Part(text=prompt)]
-    for ref in references:
-        parsed = _parse_data_url(ref)
-        if not parsed:
-            return None, "unsupported reference image format"
-        data, mime = parsed
-        parts.append(types.Part(inline_data=types.Blob(data=data, mime_type=mime)))
+    parts.extend(
+        types.Part(inline_data=types.Blob(data=data, mime_type=mime))
+        for data, mime in parsed_references
+    )
 
     debug_log(
         "gemini_generate request",
@@ -71,7 +90,27 @@ def generate_image(
     for part in parts:
         if part.inline_data and part.inline_data.data:
             mime_type = part.inline_data.mime_type or "image/png"
-            encoded = base64.b64encode(part.inline_data.data).decode("ascii")
-            return f"data:{mime_type};base64,{encoded}", None
+            return (part.inline_data.data, mime_type), None
 
     return None, "no image data returned"
+
+
+def generate_image(
+    *,
+    model_id: str,
+    prompt: str,
+    api_key: str,
+    references: Sequence[str],
+    parsed_references: Sequence[tuple[bytes, str]] | None = None,
+) -> tuple[str | None, str | None]:
+    image, error = generate_image_bytes(
+        model_id=model_id,
+        prompt=prompt,
+        api_key=api_key,
+        references=references,
+        parsed_references=parsed_references,
+    )
+    if error or not image:
+        return None, error
+    data, mime_type = image
+    return image_bytes_to_url(data, mime_type), None
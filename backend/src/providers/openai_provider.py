@@ -1,12 +1,13 @@
 from __future__ import annotations
 
+from functools import lru_cache
 from typing import Sequence
 
 from openai import OpenAI
 
 from utils import (
     debug_log,
-    extract_image_from_response,
+    extract_images_from_response,
     is_gpt_image_model,
     resolve_gpt_image_size,
     resolve_openai_base_url,
@@ -16,8 +17,22 @@ from utils import (
     supports_seedream_sequence,
 )
 
+# gpt-image models accept n between 1 and 10 per images.generate call.
+MAX_IMAGES_PER_REQUEST = 10
 
-def generate_image(
+
+@lru_cache(maxsize=16)
+def _get_client(api_key: str, api_base: str | None) -> OpenAI:
+    if api_base:
+        return OpenAI(api_key=api_key, base_url=api_base)
+    return OpenAI(api_key=api_key)
+
+
+def supports_multiple_images(model_id: str, *, is_seedream: bool) -> bool:
+    return not is_seedream and is_gpt_image_model(model_id)
+
+
+def generate_images(
     *,
     model_id: str,
     prompt: str,
@@ -26,7 +41,8 @@ def generate_image(
     api_key: str,
     references: Sequence[str],
     is_seedream: bool,
-) -> tuple[str | None, str | None]:
+    n: int = 1,
+) -> tuple[list[str] | None, str | None]:
     if not api_key:
         return None, "api key is required"
 
@@ -36,10 +52,7 @@ def generate_image(
         if is_seedream
         else resolve_openai_base_url(base_url)
     )
-    client_kwargs: dict[str, str] = {"api_key": api_key}
-    if api_base:
-        client_kwargs["base_url"] = api_base
-    client = OpenAI(**client_kwargs)
+    client = _get_client(api_key, api_base)
 
     payload: dict[str, object] = {
         "model": model_id,
@@ -50,7 +63,7 @@ def generate_image(
         payload["response_format"] = "b64_json"
         payload["size"] = resolve_seedream_size(size)
     elif is_gpt_image:
-        payload["n"] = 1
+        payload["n"] = n
         payload["quality"] = "medium"
         payload["size"] = resolve_gpt_image_size(size)
     else:
@@ -107,4 +120,4 @@ def generate_image(
     )
 
     mime_type = "image/jpeg" if is_seedream else "image/png"
-    return extract_image_from_response(response, mime_type=mime_type)
+    return extract_images_from_response(response, mime_type=mime_type)
@@ -1,15 +1,23 @@
 from __future__ import annotations
 
-from typing import Any
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, NamedTuple
 
 from pydantic import ValidationError
 
 from providers.aihubmix_provider import generate_image as generate_aihubmix_image
 from providers.dashscope_provider import generate_image as generate_dashscope_image
-from providers.gemini_provider import generate_image as generate_gemini_image
-from providers.openai_provider import generate_image
-from schemas import BatchGenerateRequest, GenerateRequest, GenerateResponse
-from storage import get_settings
+from providers.gemini_provider import (
+    generate_image as generate_gemini_image,
+    parse_reference_images as parse_gemini_references,
+)
+from providers.openai_provider import (
+    MAX_IMAGES_PER_REQUEST,
+    generate_images,
+    supports_multiple_images,
+)
+from schemas import BatchGenerateRequest, GenerateRequest
+from storage import Settings, get_settings
 from utils import (
     collect_reference_images,
     is_aihubmix_provider,
@@ -21,217 +29,267 @@ from utils import (
 )
 
 
-def generate_single(payload: dict[str, Any]) -> dict[str, Any]:
-    try:
-        request = GenerateRequest.model_validate(payload)
-    except ValidationError as exc:
-        return {"ok": False, "error": exc.errors()}
+_BATCH_CONCURRENCY = 8
+
+
+class _GenerationTarget(NamedTuple):
+    model_id: str
+    provider_name: str
+    provider_model_id: str
+    api_key: str
+    base_url: str | None
+    kind: str
+
 
+def _error_result(model_id: str, prompt: str, error: str) -> dict[str, Any]:
+    return {
+        "ok": False,
+        "modelId": model_id,
+        "prompt": prompt,
+        "error": error,
+    }
+
+
+def _success_result(model_id: str, prompt: str, image_url: str) -> dict[str, Any]:
+    # Same shape as GenerateResponse.model_dump(by_alias=True).
+    return {
+        "ok": True,
+        "modelId": model_id,
+        "prompt": prompt,
+        "imageUrl": image_url,
+        "error": None,
+    }
+
+
+def _provider_kind(provider_name: str, base_url: str, model_id: str) -> str:
+    if is_dashscope_provider(provider_name, base_url, model_id):
+        return "dashscope"
+    if is_aihubmix_provider(provider_name, base_url):
+        return "aihubmix"
+    if provider_name == "Google Gemini":
+        return "gemini"
+    if is_seedream_provider(provider_name, base_url, model_id):
+        return "seedream"
+    return "openai"
+
+
+def _resolve_target(
+    model_id: str,
+    provider_name: str | None,
+    settings_cache: dict[str, Settings | None],
+) -> tuple[_GenerationTarget | None, str | None]:
     # Resolve provider
-    if request.provider_name:
-        provider_name = request.provider_name
-    else:
-        provider_name = resolve_provider_name(request.model_id)
+    if not provider_name:
+        provider_name = resolve_provider_name(model_id)
 
     if not provider_name:
-        return {
-            "ok": False,
-            "error": "provider not found for model",
-            "modelId": request.model_id,
-            "prompt": request.prompt,
-        }
-
-    settings = get_settings(provider_name)
+        return None, "provider not found for model"
+
+    if provider_name not in settings_cache:
+        settings_cache[provider_name] = get_settings(provider_name)
+    settings = settings_cache[provider_name]
     if not settings or not settings.api_key:
-        return {
-            "ok": False,
-            "error": "provider config not found or apiKey missing",
-            "modelId": request.model_id,
-            "prompt": request.prompt,
-        }
+        return None, "provider config not found or apiKey missing"
 
     base_url = settings.base_url or resolve_default_base_url(
-        provider_name, request.model_id
+        provider_name, model_id
     )
     if provider_name != "Google Gemini" and not base_url:
-        return {
-            "ok": False,
-            "error": "baseUrl missing for provider",
-            "modelId": request.model_id,
-            "prompt": request.prompt,
-        }
-
-    references = collect_reference_images(request.references)
-    provider_model_id = resolve_provider_model_id(
-        provider_name, request.model_id
+        return None, "baseUrl missing for provider"
+
+    provider_model_id = resolve_provider_model_id(provider_name, model_id)
+    return (
+        _GenerationTarget(
+            model_id=model_id,
+            provider_name=provider_name,
+            provider_model_id=provider_model_id,
+            api_key=settings.api_key,
+            base_url=base_url,
+            kind=_provider_kind(provider_name, base_url or "", model_id),
+        ),
+        None,
     )
-    if is_dashscope_provider(provider_name, base_url or "", request.model_id):
-        image_url, error = generate_dashscope_image(
+
+
+def _supports_multiple_images(target: _GenerationTarget) -> bool:
+    return target.kind == "openai" and supports_multiple_images(
+        target.provider_model_id, is_seedream=False
+    )
+
+
+def _generate_for_target(
+    target: _GenerationTarget,
+    *,
+    prompt: str,
+    size: str | None,
+    references: tuple[str, ...],
+    count: int = 1,
+    gemini_references: tuple[tuple[bytes, str], ...] | None = None,
+) -> tuple[list[str] | None, str | None]:
+    provider_model_id = target.provider_model_id
+    base_url = target.base_url or ""
+    if target.kind in ("openai", "seedream"):
+        return generate_images(
             model_id=provider_model_id,
-            prompt=request.prompt,
-            size=request.size,
-            base_url=base_url or "",
-            api_key=settings.api_key,
+            prompt=prompt,
+            size=size,
+            base_url=base_url,
+            api_key=target.api_key,
             references=references,
+            is_seedream=target.kind == "seedream",
+            n=count,
         )
-    elif is_aihubmix_provider(provider_name, base_url or ""):
-        image_url, error = generate_aihubmix_image(
+
+    if target.kind == "dashscope":
+        image_url, error = generate_dashscope_image(
             model_id=provider_model_id,
-            prompt=request.prompt,
-            size=request.size,
-            base_url=base_url or "",
-            api_key=settings.api_key,
+            prompt=prompt,
+            size=size,
+            base_url=base_url,
+            api_key=target.api_key,
             references=references,
         )
-    elif provider_name == "Google Gemini":
-        image_url, error = generate_gemini_image(
+    elif target.kind == "aihubmix":
+        image_url, error = generate_aihubmix_image(
             model_id=provider_model_id,
-            prompt=request.prompt,
-            api_key=settings.api_key,
+            prompt=prompt,
+            size=size,
+            base_url=base_url,
+            api_key=target.api_key,
             references=references,
         )
     else:
-        is_seedream = is_seedream_provider(
-            provider_name, base_url or "", request.model_id
-        )
-        image_url, error = generate_image(
+        image_url, error = generate_gemini_image(
             model_id=provider_model_id,
-            prompt=request.prompt,
-            size=request.size,
-            base_url=base_url or "",
-            api_key=settings.api_key,
+            prompt=prompt,
+            api_key=target.api_key,
             references=references,
-            is_seedream=is_seedream,
+            parsed_references=gemini_references,
         )
-
     if error or not image_url:
-        return {
-            "ok": False,
-            "error": error or "generation failed",
-            "modelId": request.model_id,
-            "prompt": request.prompt,
-        }
-
-    response = GenerateResponse(
-        ok=True,
-        model_id=request.model_id,
-        prompt=request.prompt,
-        image_url=image_url,
-    )
-    return response.model_dump(by_alias=True)
+        return None, error
+    return [image_url], None
 
 
-def generate_batch(payload: dict[str, Any]) -> dict[str, Any]:
+def generate_single(payload: dict[str, Any]) -> dict[str, Any]:
     try:
-        request = BatchGenerateRequest.model_validate(payload)
+        request = GenerateRequest.model_validate(payload)
     except ValidationError as exc:
         return {"ok": False, "error": exc.errors()}
 
-    references = collect_reference_images(request.references)
-    images: list[dict[str, Any]] = []
-
-    provider_name_override = request.provider_name
-    for model_id in request.model_ids:
-        # Resolve provider
-        if provider_name_override:
-            provider_name = provider_name_override
-        else:
-            provider_name = resolve_provider_name(model_id)
-
-        if not provider_name:
-            images.append(
-                {
-                    "ok": False,
-                    "modelId": model_id,
-                    "prompt": request.prompt,
-                    "error": "provider not found for model",
-                }
-            )
-            continue
-
-        settings = get_settings(provider_name)
-        if not settings or not settings.api_key:
-            images.append(
-                {
-                    "ok": False,
-                    "modelId": model_id,
-                    "prompt": request.prompt,
-                    "error": "provider config not found or apiKey missing",
-                }
-            )
-            continue
+    target, error = _resolve_target(request.model_id, request.provider_name, {})
+    if not target:
+        return _error_result(request.model_id, request.prompt, error)
 
-        base_url = settings.base_url or resolve_default_base_url(
-            provider_name, model_id
+    image_urls, error = _generate_for_target(
+        target,
+        prompt=request.prompt,
+        size=request.size,
+        references=collect_reference_images(request.references),
+    )
+    if error or not image_urls:
+        return _error_result(
+            request.model_id, request.prompt, error or "generation failed"
         )
-        if provider_name != "Google Gemini" and not base_url:
-            images.append(
-                {
-                    "ok": False,
-                    "modelId": model_id,
-                    "prompt": request.prompt,
-                    "error": "baseUrl missing for provider",
-                }
-            )
-            continue
+    return _success_result(request.model_id, request.prompt, image_urls[0])
 
-        provider_model_id = resolve_provider_model_id(provider_name, model_id)
-        if is_dashscope_provider(provider_name, base_url or "", model_id):
-            image_url, error = generate_dashscope_image(
-                model_id=provider_model_id,
-                prompt=request.prompt,
-                size=request.size,
-                base_url=base_url or "",
-                api_key=settings.api_key,
-                references=references,
-            )
-        elif is_aihubmix_provider(provider_name, base_url or ""):
-            image_url, error = generate_aihubmix_image(
-                model_id=provider_model_id,
-                prompt=request.prompt,
-                size=request.size,
-                base_url=base_url or "",
-                api_key=settings.api_key,
-                references=references,
-            )
-        elif provider_name == "Google Gemini":
-            image_url, error = generate_gemini_image(
-                model_id=provider_model_id,
-                prompt=request.prompt,
-                api_key=settings.api_key,
-                references=references,
-            )
-        else:
-            is_seedream = is_seedream_provider(
-                provider_name, base_url or "", model_id
-            )
-            image_url, error = generate_image(
-                model_id=provider_model_id,
-                prompt=request.prompt,
-                size=request.size,
-                base_url=base_url or "",
-                api_key=settings.api_key,
-                references=references,
-                is_seedream=is_seedream,
-            )
 
-        if error or not image_url:
-            images.append(
-                {
-                    "ok": False,
-                    "modelId": model_id,
-                    "prompt": request.prompt,
-                    "error": error or "generation failed",
-                }
-            )
+class _BatchJob(NamedTuple):
+    target: _GenerationTarget
+    indices: list[int]
+    count: int
+
+
+def _plan_batch_jobs(
+    resolved: list[tuple[_GenerationTarget | None, str | None]],
+) -> list[_BatchJob]:
+    # Every slot gets its own image. Repeats of a target whose endpoint
+    # accepts n > 1 share one request for up to MAX_IMAGES_PER_REQUEST
+    # images; any other target is requested once per slot.
+    jobs: list[_BatchJob] = []
+    open_jobs: dict[_GenerationTarget, _BatchJob] = {}
+    for index, (target, _) in enumerate(resolved):
+        if not target:
+            continue
+        if not _supports_multiple_images(target):
+            jobs.append(_BatchJob(target, [index], 1))
             continue
+        job = open_jobs.get(target)
+        if job is None or len(job.indices) >= MAX_IMAGES_PER_REQUEST:
+            job = open_jobs[target] = _BatchJob(target, [], 0)
+            jobs.append(job)
+        job.indices.append(index)
+    return [job._replace(count=len(job.indices)) for job in jobs]
 
-        response = GenerateResponse(
-            ok=True,
-            model_id=model_id,
-            prompt=request.prompt,
-            image_url=image_url,
-        )
-        images.append(response.model_dump(by_alias=True))
 
+def _collect_batch_urls(
+    future: Future[tuple[list[str] | None, str | None]],
+) -> tuple[list[str] | None, str | None]:
+    try:
+        return future.result()
+    except Exception as exc:
+        return None, f"generation failed: {exc}"
+
+
+def generate_batch(payload: dict[str, Any]) -> dict[str, Any]:
+    try:
+        request = BatchGenerateRequest.model_validate(payload)
+    except ValidationError as exc:
+        return {"ok": False, "error": exc.errors()}
+
+    model_ids = request.model_ids
+    if not model_ids:
+        return {"ok": True, "images": []}
+
+    # Resolve every distinct model up front so settings are read once per
+    # provider on this thread; repeated or misconfigured models reuse the
+    # cached target or error instead of resolving again.
+    settings_cache: dict[str, Settings | None] = {}
+    resolved_by_model: dict[str, tuple[_GenerationTarget | None, str | None]] = {}
+    for model_id in model_ids:
+        if model_id not in resolved_by_model:
+            resolved_by_model[model_id] = _resolve_target(
+                model_id, request.provider_name, settings_cache
+            )
+    resolved = [resolved_by_model[model_id] for model_id in model_ids]
+    images: list[dict[str, Any] | None] = [
+        None if target else _error_result(model_id, request.prompt, error)
+        for model_id, (target, error) in zip(model_ids, resolved)
+    ]
+
+    jobs = _plan_batch_jobs(resolved)
+    if jobs:
+        references = collect_reference_images(request.references)
+        # Decode data URLs for Gemini once rather than once per Gemini model.
+        gemini_references = None
+        if any(job.target.kind == "gemini" for job in jobs):
+            gemini_references, _ = parse_gemini_references(references)
+        max_workers = min(len(jobs), _BATCH_CONCURRENCY)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [
+                executor.submit(
+                    _generate_for_target,
+                    job.target,
+                    prompt=request.prompt,
+                    size=request.size,
+                    references=references,
+                    count=job.count,
+                    gemini_references=gemini_references,
+                )
+                for job in jobs
+            ]
+            for job, future in zip(jobs, futures):
+                image_urls, error = _collect_batch_urls(future)
+                image_urls = image_urls or []
+                for position, index in enumerate(job.indices):
+                    if position < len(image_urls):
+                        images[index] = _success_result(
+                            model_ids[index], request.prompt, image_urls[position]
+                        )
+                    else:
+                        images[index] = _error_result(
+                            model_ids[index],
+                            request.prompt,
+                            error or "generation failed",
+                        )
     return {"ok": True, "images": images}
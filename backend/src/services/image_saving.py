@@ -1,18 +1,22 @@
 from __future__ import annotations
 
-import base64
 import mimetypes
 import os
 import re
 import urllib.parse
 import urllib.request
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Any
 
+import pybase64
 from pydantic import ValidationError
 
-from schemas import SaveImagesRequest
+from schemas import SaveImageItem, SaveImagesRequest
 from storage import DATA_DIR, get_app_setting, set_app_setting
+from utils import http_get, read_local_file
+
+_FETCH_CONCURRENCY = 8
 
 _MIME_EXTENSION_MAP = {
     "image/jpeg": ".jpg",
@@ -34,42 +38,32 @@ def _decode_data_url(data_url: str) -> tuple[bytes | None, str | None]:
     is_base64 = ";base64" in header
     try:
         if is_base64:
-            return base64.b64decode(payload), mime
+            return pybase64.b64decode(payload, validate=False), mime
+        if "%" not in payload:
+            # Nothing to unescape, e.g. inline SVG markup.
+            return payload.encode("utf-8"), mime
         return urllib.parse.unquote_to_bytes(payload), mime
     except (ValueError, OSError):
         return None, mime
 
 
-def _load_image_bytes(image_url: str) -> tuple[bytes | None, str | None]:
+def _load_image_bytes(
+    image_url: str,
+) -> tuple[bytes | None, str | None]:
     if not image_url:
         return None, None
     if image_url.startswith("data:"):
         return _decode_data_url(image_url)
     parsed = urllib.parse.urlparse(image_url)
     if parsed.scheme in {"http", "https"}:
-        try:
-            with urllib.request.urlopen(image_url) as response:
-                content_type = None
-                if hasattr(response.headers, "get_content_type"):
-                    content_type = response.headers.get_content_type()
-                else:
-                    content_type = response.headers.get("Content-Type")
-                if content_type:
-                    content_type = content_type.split(";", 1)[0]
-                return response.read(), content_type
-        except (OSError, ValueError):
-            return None, None
+        return http_get(image_url)
     if parsed.scheme == "file":
         file_path = urllib.request.url2pathname(parsed.path)
         if os.path.exists(file_path):
-            with open(file_path, "rb") as handle:
-                mime = mimetypes.guess_type(file_path)[0]
-                return handle.read(), mime
+            return read_local_file(file_path), mimetypes.guess_type(file_path)[0]
         return None, None
     if os.path.exists(image_url):
-        with open(image_url, "rb") as handle:
-            mime = mimetypes.guess_type(image_url)[0]
-            return handle.read(), mime
+        return read_local_file(image_url), mimetypes.guess_type(image_url)[0]
     return None, None
 
 
@@ -111,6 +105,36 @@ def choose_save_directory(window: Any | None = None) -> dict[str, Any]:
     return {"ok": True, "directory": str(directory)}
 
 
+def _write_image(
+    target_dir: Path,
+    index: int,
+    item: SaveImageItem,
+    image_bytes: bytes | None,
+    mime: str | None,
+) -> dict[str, Any]:
+    if not image_bytes:
+        return {"id": item.id, "error": "image not found"}
+
+    extension = _extension_for(item.image_url, mime)
+    base_name = item.filename or item.id or f"image_{index}"
+    filename = _sanitize_filename(base_name)
+    if not filename.lower().endswith(extension):
+        filename = f"{filename}{extension}"
+    file_path = target_dir / filename
+    counter = 1
+    while file_path.exists():
+        stem = _sanitize_filename(base_name)
+        file_path = target_dir / f"{stem}-{counter}{extension}"
+        counter += 1
+
+    try:
+        with open(file_path, "wb") as handle:
+            handle.write(image_bytes)
+    except OSError as exc:
+        return {"id": item.id, "error": str(exc)}
+    return {"id": item.id, "path": str(file_path)}
+
+
 def save_images(payload: dict[str, Any], window: Any | None = None) -> dict[str, Any]:
     try:
         request = SaveImagesRequest.model_validate(payload)
@@ -136,30 +160,24 @@ def save_images(payload: dict[str, Any], window: Any | None = None) -> dict[str,
         target_dir = DATA_DIR / "exports"
     target_dir.mkdir(parents=True, exist_ok=True)
 
+    images = request.images
     results: list[dict[str, Any]] = []
-    for index, item in enumerate(request.images, start=1):
-        image_bytes, mime = _load_image_bytes(item.image_url)
-        if not image_bytes:
-            results.append({"id": item.id, "error": "image not found"})
-            continue
-
-        extension = _extension_for(item.image_url, mime)
-        base_name = item.filename or item.id or f"image_{index}"
-        filename = _sanitize_filename(base_name)
-        if not filename.lower().endswith(extension):
-            filename = f"{filename}{extension}"
-        file_path = target_dir / filename
-        counter = 1
-        while file_path.exists():
-            stem = _sanitize_filename(base_name)
-            file_path = target_dir / f"{stem}-{counter}{extension}"
-            counter += 1
-
-        try:
-            with open(file_path, "wb") as handle:
-                handle.write(image_bytes)
-            results.append({"id": item.id, "path": str(file_path)})
-        except OSError as exc:
-            results.append({"id": item.id, "error": str(exc)})
+    # Downloads run on the pool one window at a time, so at most
+    # _FETCH_CONCURRENCY images are held in memory; naming and writing stay
+    # sequential so collision suffixes are stable.
+    with ThreadPoolExecutor(
+        max_workers=min(len(images), _FETCH_CONCURRENCY)
+    ) as executor:
+        for start in range(0, len(images), _FETCH_CONCURRENCY):
+            window_items = images[start : start + _FETCH_CONCURRENCY]
+            loaded = executor.map(
+                lambda item: _load_image_bytes(item.image_url), window_items
+            )
+            results.extend(
+                _write_image(target_dir, index, item, image_bytes, mime)
+                for index, (item, (image_bytes, mime)) in enumerate(
+                    zip(window_items, loaded), start=start + 1
+                )
+            )
 
     return {"ok": True, "directory": str(target_dir), "results": results}
@@ -1,56 +1,82 @@
 from __future__ import annotations
 
-import json
+import hashlib
 import os
 import subprocess
 import sys
-import textwrap
-import urllib.error
+import time
 import urllib.parse
-import urllib.request
 import re
+import string
+from dataclasses import dataclass, replace
+from functools import lru_cache
 from pathlib import Path
 from threading import Lock
 from typing import Any
 
+import orjson
+import urllib3
 from app_info import APP_REPO, APP_REPO_URL, APP_VERSION
 from storage import DATA_DIR
+from utils import http_pool
 
 _GITHUB_API_BASE = "https://api.github.com"
+_RELEASE_CACHE_PATH = DATA_DIR / "update_cache.json"
+_RELEASE_CACHE_VERSION = 1
 _TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+_TOKEN_SEPARATORS = str.maketrans(
+    {
+        chr(code): " "
+        for code in range(128)
+        if chr(code) not in string.ascii_lowercase + string.digits
+    }
+)
+_USER_AGENT = f"ParaImage/{APP_VERSION}"
+# Release downloads hop from github.com to a CDN host, so redirects get their
+# own budget instead of sharing the pool's retry total.
+_UPDATE_RETRIES = urllib3.Retry(connect=2, read=2, redirect=5, backoff_factor=0.3)
+
+
+@dataclass
+class _DownloadProgress:
+    active: bool = False
+    done: bool = False
+    downloaded: int = 0
+    total: int | None = None
+    error: str | None = None
+
 
+# The lock guards start/finish transitions only. The download loop bumps
+# `downloaded` unlocked (a single writer; int stores are atomic under the
+# GIL) and percent is derived when progress is read.
 _DOWNLOAD_PROGRESS_LOCK = Lock()
-_DOWNLOAD_PROGRESS: dict[str, Any] = {
-    "active": False,
-    "done": False,
-    "downloaded": 0,
-    "total": None,
-    "percent": None,
-    "error": None,
-}
+_DOWNLOAD_PROGRESS = _DownloadProgress()
+_DOWNLOAD_LOCK = Lock()
 
 
+@lru_cache(maxsize=32)
 def _parse_version(value: str) -> tuple[int, int, int]:
     cleaned = value.strip()
     if cleaned.startswith(("v", "V")):
         cleaned = cleaned[1:]
     cleaned = cleaned.split("+", 1)[0].split("-", 1)[0]
-    parts = cleaned.split(".")
+    # Each dotted component is parsed on its own, so "1.x.3" is (1, 0, 3).
     numbers: list[int] = []
-    for part in parts:
+    for part in cleaned.split(".")[:3]:
         try:
             numbers.append(int(part))
         except ValueError:
             numbers.append(0)
     while len(numbers) < 3:
         numbers.append(0)
-    return tuple(numbers[:3])
+    return tuple(numbers)
 
 
 def _is_newer(latest: str, current: str) -> bool:
     return _parse_version(latest) > _parse_version(current)
 
 
+@lru_cache(maxsize=1)
 def _platform_key() -> str:
     if sys.platform.startswith("win"):
         return "windows"
@@ -75,9 +101,7 @@ _PLATFORM_ASSET_EXTENSIONS: dict[str, dict[str, tuple[str, ...]]] = {
 }
 
 
-def _platform_asset_kind(name: str) -> str | None:
-    lowered = name.lower()
-    platform_key = _platform_key()
+def _asset_kind(lowered: str, platform_key: str) -> str | None:
     candidates = _PLATFORM_ASSET_EXTENSIONS.get(platform_key, {})
     for kind, suffixes in candidates.items():
         if lowered.endswith(suffixes):
@@ -85,8 +109,8 @@ def _platform_asset_kind(name: str) -> str | None:
     return None
 
 
-def _asset_tokens(name: str) -> list[str]:
-    return _TOKEN_PATTERN.findall(name.lower())
+def _platform_asset_kind(name: str) -> str | None:
+    return _asset_kind(name.lower(), _platform_key())
 
 
 def _matches_platform(tokens: list[str], platform_key: str) -> bool:
@@ -105,13 +129,11 @@ def _matches_platform(tokens: list[str], platform_key: str) -> bool:
     )
 
 
-def _asset_platforms(name: str) -> set[str]:
-    tokens = _asset_tokens(name)
-    platforms = set()
-    for platform_key in ("windows", "macos", "linux"):
-        if _matches_platform(tokens, platform_key):
-            platforms.add(platform_key)
-    return platforms
+def _asset_tokens(lowered: str) -> list[str]:
+    # Release asset names are ASCII; a translate + split walks them once in C.
+    if lowered.isascii():
+        return lowered.translate(_TOKEN_SEPARATORS).split()
+    return _TOKEN_PATTERN.findall(lowered)
 
 
 def _is_update_archive(name: str) -> bool:
@@ -124,59 +146,119 @@ def _pick_asset(
     if not assets:
         return None
     platform_key = _platform_key()
-    candidates: list[dict[str, Any]] = []
-    generic: list[dict[str, Any]] = []
+    other_platforms = tuple(
+        key for key in _PLATFORM_ASSET_EXTENSIONS if key != platform_key
+    )
+    # Single pass: each name is lowered and tokenized once, and assets are
+    # bucketed by kind for this platform (True) or for no platform (False).
+    buckets: dict[bool, dict[str | None, list[dict[str, Any]]]] = {
+        True: {},
+        False: {},
+    }
     for asset in assets:
         name = str(asset.get("name") or "")
         if not name:
             continue
-        platforms = _asset_platforms(name)
-        if platform_key in platforms:
-            candidates.append(asset)
+        lowered = name.lower()
+        tokens = _asset_tokens(lowered)
+        if _matches_platform(tokens, platform_key):
+            group = buckets[True]
+        elif any(_matches_platform(tokens, other) for other in other_platforms):
             continue
-        if not platforms:
-            generic.append(asset)
-    if not candidates:
-        candidates = generic
+        else:
+            group = buckets[False]
+        group.setdefault(_asset_kind(lowered, platform_key), []).append(asset)
+
+    candidates = buckets[True] or buckets[False]
     if not candidates:
         return None
-    supported = []
-    for asset in candidates:
-        name = str(asset.get("name") or "")
-        if _platform_asset_kind(name):
-            supported.append(asset)
-    if supported:
-        candidates = supported
-    if preferred_kind:
-        for asset in candidates:
-            name = str(asset.get("name") or "")
-            if _platform_asset_kind(name) == preferred_kind:
-                return asset
-    for asset in candidates:
-        name = str(asset.get("name") or "")
-        if _is_update_archive(name):
-            return asset
-    for asset in candidates:
-        name = str(asset.get("name") or "")
-        if _platform_asset_kind(name) == "installer":
-            return asset
-    return candidates[0]
+    for kind in (preferred_kind, "archive", "installer"):
+        if kind and candidates.get(kind):
+            return candidates[kind][0]
+    return candidates[None][0]
 
 
-def check_for_updates() -> dict[str, Any]:
+def _load_release_cache() -> dict[str, Any] | None:
+    try:
+        cached = orjson.loads(_RELEASE_CACHE_PATH.read_bytes())
+    except (OSError, ValueError):
+        return None
+    if (
+        not isinstance(cached, dict)
+        or cached.get("schemaVersion") != _RELEASE_CACHE_VERSION
+        or cached.get("repo") != APP_REPO
+        or not isinstance(cached.get("payload"), dict)
+    ):
+        return None
+    return cached
+
+
+def _store_release_cache(
+    etag: str | None, last_modified: str | None, payload: dict[str, Any]
+) -> None:
+    cached = {
+        "schemaVersion": _RELEASE_CACHE_VERSION,
+        "repo": APP_REPO,
+        "etag": etag,
+        "lastModified": last_modified,
+        "fetchedAt": time.time(),
+        "payload": payload,
+    }
+    temp_path = _RELEASE_CACHE_PATH.with_suffix(".tmp")
+    try:
+        _RELEASE_CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+        temp_path.write_bytes(orjson.dumps(cached))
+        os.replace(temp_path, _RELEASE_CACHE_PATH)
+    except (OSError, orjson.JSONEncodeError):
+        pass
+
+
+def _fetch_latest_release() -> tuple[Any, str | None]:
+    cached = _load_release_cache()
+    # Conditional request: GitHub answers 304 with no body while the
+    # release is unchanged, and the cached payload is reused.
     url = f"{_GITHUB_API_BASE}/repos/{APP_REPO}/releases/latest"
-    request = urllib.request.Request(
-        url,
-        headers={
-            "Accept": "application/vnd.github+json",
-            "User-Agent": f"ParaImage/{APP_VERSION}",
-        },
-    )
+    headers = {
+        "Accept": "application/vnd.github+json",
+        "Accept-Encoding": "gzip",
+        "User-Agent": _USER_AGENT,
+    }
+    if cached:
+        if cached.get("etag"):
+            headers["If-None-Match"] = cached["etag"]
+        if cached.get("lastModified"):
+            headers["If-Modified-Since"] = cached["lastModified"]
     try:
-        with urllib.request.urlopen(request, timeout=8) as response:
-            payload = json.loads(response.read().decode("utf-8"))
-    except (OSError, ValueError, urllib.error.URLError) as exc:
-        return {"ok": False, "error": str(exc)}
+        # The pool keeps the TLS session to GitHub alive between checks and
+        # the asset download that usually follows; gzip is decoded for us.
+        response = http_pool(url).request(
+            "GET", url, headers=headers, retries=_UPDATE_RETRIES, timeout=8
+        )
+        if response.status == 304 and cached:
+            _store_release_cache(
+                cached.get("etag"), cached.get("lastModified"), cached["payload"]
+            )
+            return cached["payload"], None
+        if response.status >= 300:
+            return None, _http_error(response)
+        payload = orjson.loads(response.data)
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+    except (OSError, ValueError, urllib3.exceptions.HTTPError) as exc:
+        return None, str(exc)
+    if isinstance(payload, dict):
+        _store_release_cache(etag, last_modified, payload)
+    return payload, None
+
+
+def _http_error(response: urllib3.BaseHTTPResponse) -> str:
+    return f"HTTP Error {response.status}: {response.reason}"
+
+
+def check_for_updates() -> dict[str, Any]:
+    payload, error = _fetch_latest_release()
+    if error:
+        return {"ok": False, "error": error}
 
     if not isinstance(payload, dict):
         return {"ok": False, "error": "unexpected response"}
@@ -229,83 +311,282 @@ def check_for_updates() -> dict[str, Any]:
 def download_update(asset_url: str) -> dict[str, Any]:
     if not asset_url or not isinstance(asset_url, str):
         return {"ok": False, "error": "missing asset url"}
-    if not asset_url.startswith("https://"):
+    parsed = urllib.parse.urlparse(asset_url)
+    if parsed.scheme != "https":
         return {"ok": False, "error": "invalid asset url"}
-    if f"/{APP_REPO}/releases/download/" not in asset_url:
+    # Structural check: a marker in the query string or on another host no
+    # longer passes for a release asset.
+    if parsed.hostname != "github.com" or not parsed.path.startswith(
+        f"/{APP_REPO}/releases/download/"
+    ):
         return {"ok": False, "error": "asset url not from release"}
 
-    filename = Path(urllib.parse.urlparse(asset_url).path).name
+    filename = Path(parsed.path).name
     if not filename:
         return {"ok": False, "error": "invalid asset url"}
 
-    updates_dir = DATA_DIR / "updates"
-    updates_dir.mkdir(parents=True, exist_ok=True)
-    target_path = updates_dir / filename
+    target_path = _updates_dir() / filename
 
+    # One download at a time: progress is global, and a second caller for
+    # the same asset waits for the first instead of racing its writes.
+    with _DOWNLOAD_LOCK:
+        if _is_current_download(asset_url, target_path):
+            return _finish_cached_download(target_path)
+        return _download_asset(
+            asset_url, target_path, _published_digest(asset_url)
+        )
+
+
+def _published_digest(asset_url: str) -> str | None:
+    # GitHub lists a "sha256:<hex>" digest for each release asset; the
+    # release was fetched by check_for_updates and is cached on disk.
+    cached = _load_release_cache()
+    assets = cached["payload"].get("assets") if cached else None
+    if not isinstance(assets, list):
+        return None
+    for asset in assets:
+        if isinstance(asset, dict) and asset.get("browser_download_url") == asset_url:
+            algorithm, _, digest = str(asset.get("digest") or "").partition(":")
+            if algorithm == "sha256" and digest:
+                return digest.lower()
+            return None
+    return None
+
+
+def _etag_path(target_path: Path) -> Path:
+    return target_path.with_name(f"{target_path.name}.etag")
+
+
+def _is_current_download(asset_url: str, target_path: Path) -> bool:
+    # A HEAD round-trip is far cheaper than refetching an archive that is
+    # already on disk with the same size and ETag.
+    try:
+        size = target_path.stat().st_size
+        etag = _etag_path(target_path).read_text(encoding="utf-8").strip()
+    except OSError:
+        return False
+    if not etag:
+        return False
+    try:
+        response = http_pool(asset_url).request(
+            "HEAD",
+            asset_url,
+            headers={"User-Agent": _USER_AGENT},
+            retries=_UPDATE_RETRIES,
+            timeout=8,
+        )
+    except (OSError, urllib3.exceptions.HTTPError):
+        return False
+    if response.status >= 300:
+        return False
+    length = (response.headers.get("Content-Length") or "").strip()
+    remote_etag = (response.headers.get("ETag") or "").strip()
+    return length.isdigit() and int(length) == size and remote_etag == etag
+
+
+def _finish_cached_download(target_path: Path) -> dict[str, Any]:
+    try:
+        size = target_path.stat().st_size
+    except OSError as exc:
+        return {"ok": False, "error": str(exc)}
+    with _DOWNLOAD_PROGRESS_LOCK:
+        _DOWNLOAD_PROGRESS.active = False
+        _DOWNLOAD_PROGRESS.done = True
+        _DOWNLOAD_PROGRESS.downloaded = size
+        _DOWNLOAD_PROGRESS.total = size or None
+        _DOWNLOAD_PROGRESS.error = None
+    return {"ok": True, "path": str(target_path)}
+
+
+def _validator_path(temp_path: Path) -> Path:
+    return temp_path.with_name(f"{temp_path.name}.validator")
+
+
+def _discard_partial(temp_path: Path) -> None:
+    temp_path.unlink(missing_ok=True)
+    _validator_path(temp_path).unlink(missing_ok=True)
+
+
+def _partial_state(temp_path: Path) -> tuple[int, str | None]:
+    # A partial is only resumable together with the validator of the asset
+    # it came from; asset names are reused across releases.
+    try:
+        size = temp_path.stat().st_size
+    except OSError:
+        return 0, None
+    try:
+        validator = _validator_path(temp_path).read_text(encoding="utf-8").strip()
+    except OSError:
+        validator = ""
+    if not size or not validator:
+        _discard_partial(temp_path)
+        return 0, None
+    return size, validator
+
+
+def _response_validator(response: urllib3.BaseHTTPResponse) -> str | None:
+    # If-Range only accepts a strong ETag or a Last-Modified date.
+    etag = (response.headers.get("ETag") or "").strip()
+    if etag and not etag.startswith("W/"):
+        return etag
+    return (response.headers.get("Last-Modified") or "").strip() or None
+
+
+def _open_asset_stream(
+    asset_url: str, temp_path: Path
+) -> tuple[urllib3.BaseHTTPResponse, int]:
+    """Return the asset response and the offset its body starts at."""
+    for _ in range(2):
+        resume_from, validator = _partial_state(temp_path)
+        headers = {"User-Agent": _USER_AGENT}
+        if resume_from:
+            # The server sends the remainder only while the asset still
+            # matches the validator, and the whole asset otherwise.
+            headers["Range"] = f"bytes={resume_from}-"
+            headers["If-Range"] = validator
+        response = http_pool(asset_url).request(
+            "GET",
+            asset_url,
+            headers=headers,
+            retries=_UPDATE_RETRIES,
+            timeout=30,
+            preload_content=False,
+        )
+        if response.status == 416:
+            # The kept prefix no longer fits the asset; retry from zero.
+            response.close()
+            _discard_partial(temp_path)
+            continue
+        if response.status >= 300:
+            response.close()
+            raise OSError(_http_error(response))
+        if response.status == 206:
+            content_range = response.headers.get("Content-Range") or ""
+            if not resume_from or not content_range.startswith(
+                f"bytes {resume_from}-"
+            ):
+                response.close()
+                _discard_partial(temp_path)
+                raise OSError(f"unexpected Content-Range: {content_range!r}")
+            return response, resume_from
+        # A full body: either a fresh download or the partial was stale.
+        validator = _response_validator(response)
+        try:
+            if validator:
+                _validator_path(temp_path).write_text(validator, encoding="utf-8")
+            else:
+                _validator_path(temp_path).unlink(missing_ok=True)
+        except OSError:
+            response.close()
+            raise
+        return response, 0
+    raise OSError(_http_error(response))
+
+
+def _download_asset(
+    asset_url: str, target_path: Path, expected_digest: str | None = None
+) -> dict[str, Any]:
+    # Stream into a temporary sibling and rename only once complete, so
+    # target_path never holds a truncated archive. A partial file left by
+    # an interrupted attempt is resumed with a conditional Range request.
+    temp_path = target_path.with_name(f".{target_path.name}.part")
     try:
         with _DOWNLOAD_PROGRESS_LOCK:
-            _DOWNLOAD_PROGRESS.update(
-                {
-                    "active": True,
-                    "done": False,
-                    "downloaded": 0,
-                    "total": None,
-                    "percent": 0,
-                    "error": None,
-                }
-            )
-        with urllib.request.urlopen(asset_url, timeout=30) as response:
+            _DOWNLOAD_PROGRESS.active = True
+            _DOWNLOAD_PROGRESS.done = False
+            _DOWNLOAD_PROGRESS.downloaded = 0
+            _DOWNLOAD_PROGRESS.total = None
+            _DOWNLOAD_PROGRESS.error = None
+        response, resume_from = _open_asset_stream(asset_url, temp_path)
+        try:
             total_header = (response.headers.get("Content-Length") or "").strip()
             total_size = int(total_header) if total_header.isdigit() else None
-            if total_size:
-                with _DOWNLOAD_PROGRESS_LOCK:
-                    _DOWNLOAD_PROGRESS.update({"total": total_size})
-            with open(target_path, "wb") as handle:
-                downloaded = 0
-                while True:
-                    chunk = response.read(1024 * 1024)
-                    if not chunk:
-                        break
+            hasher = None
+            if resume_from:
+                if expected_digest:
+                    # The digest covers the whole archive, so the kept
+                    # prefix is hashed before appending the remainder.
+                    with open(temp_path, "rb") as existing:
+                        hasher = hashlib.file_digest(existing, "sha256")
+                if total_size is not None:
+                    total_size += resume_from
+                mode = "ab"
+            else:
+                if expected_digest:
+                    hasher = hashlib.sha256()
+                mode = "wb"
+            downloaded = resume_from
+            _DOWNLOAD_PROGRESS.total = total_size or None
+            _DOWNLOAD_PROGRESS.downloaded = downloaded
+            etag = (response.headers.get("ETag") or "").strip()
+            with open(temp_path, mode) as handle:
+                # One reusable buffer instead of a fresh bytes per chunk; the
+                # archive is hashed as it streams when a digest is published.
+                buffer = bytearray(1024 * 1024)
+                view = memoryview(buffer)
+                while size := response.readinto(buffer):
+                    chunk = view[:size]
                     handle.write(chunk)
-                    downloaded += len(chunk)
-                    percent = (
-                        min(100, int(downloaded * 100 / total_size))
-                        if total_size
-                        else None
-                    )
-                    with _DOWNLOAD_PROGRESS_LOCK:
-                        _DOWNLOAD_PROGRESS.update(
-                            {
-                                "downloaded": downloaded,
-                                "percent": percent,
-                            }
-                        )
-    except (OSError, urllib.error.URLError) as exc:
-        with _DOWNLOAD_PROGRESS_LOCK:
-            _DOWNLOAD_PROGRESS.update(
-                {
-                    "active": False,
-                    "done": True,
-                    "error": str(exc),
-                }
+                    if hasher is not None:
+                        hasher.update(chunk)
+                    downloaded += size
+                    _DOWNLOAD_PROGRESS.downloaded = downloaded
+        except BaseException:
+            # A half-read body would poison the pooled connection.
+            response.close()
+            raise
+        # Hand the drained connection back to the pool for the next check.
+        response.release_conn()
+        if total_size and downloaded != total_size:
+            raise OSError(
+                f"incomplete download: {downloaded} of {total_size} bytes"
             )
+        if hasher is not None and hasher.hexdigest() != expected_digest:
+            _discard_partial(temp_path)
+            raise OSError("downloaded update does not match its published sha256")
+        os.replace(temp_path, target_path)
+        _validator_path(temp_path).unlink(missing_ok=True)
+        etag_path = _etag_path(target_path)
+        if etag:
+            etag_path.write_text(etag, encoding="utf-8")
+        else:
+            etag_path.unlink(missing_ok=True)
+    except (OSError, urllib3.exceptions.HTTPError) as exc:
+        with _DOWNLOAD_PROGRESS_LOCK:
+            _DOWNLOAD_PROGRESS.active = False
+            _DOWNLOAD_PROGRESS.done = True
+            _DOWNLOAD_PROGRESS.error = str(exc)
         return {"ok": False, "error": str(exc)}
 
     with _DOWNLOAD_PROGRESS_LOCK:
-        _DOWNLOAD_PROGRESS.update(
-            {
-                "active": False,
-                "done": True,
-                "percent": 100 if _DOWNLOAD_PROGRESS.get("total") else _DOWNLOAD_PROGRESS.get("percent"),
-                "error": None,
-            }
-        )
+        _DOWNLOAD_PROGRESS.active = False
+        _DOWNLOAD_PROGRESS.done = True
+        _DOWNLOAD_PROGRESS.error = None
     return {"ok": True, "path": str(target_path)}
 
 
+def _progress_percent(state: _DownloadProgress) -> int | None:
+    if state.total:
+        if state.done and not state.error:
+            return 100
+        return min(100, state.downloaded * 100 // state.total)
+    if state.active and not state.downloaded:
+        return 0
+    return None
+
+
 def get_download_progress() -> dict[str, Any]:
     with _DOWNLOAD_PROGRESS_LOCK:
-        return {"ok": True, **_DOWNLOAD_PROGRESS}
+        state = replace(_DOWNLOAD_PROGRESS)
+    return {
+        "ok": True,
+        "active": state.active,
+        "done": state.done,
+        "downloaded": state.downloaded,
+        "total": state.total,
+        "percent": _progress_percent(state),
+        "error": state.error,
+    }
 
 
 def open_updates_directory() -> dict[str, Any]:
@@ -329,6 +610,7 @@ def _resolve_app_bundle(executable: Path) -> Path | None:
     return None
 
 
+@lru_cache(maxsize=1)
 def _resolve_install_paths() -> tuple[Path, Path]:
     executable = Path(sys.executable).resolve()
     if sys.platform == "darwin":
@@ -340,9 +622,14 @@ def _resolve_install_paths() -> tuple[Path, Path]:
     return target_dir, target_dir / executable.name
 
 
+@lru_cache(maxsize=8)
 def _can_write_to_dir(path: Path) -> bool:
-    if not path.exists():
+    if not path.exists() or not os.access(path, os.W_OK):
         return False
+    if not sys.platform.startswith("win"):
+        return True
+    # Windows access() only reflects the read-only attribute, not ACLs, so a
+    # positive answer is confirmed by writing a marker file (once per path).
     marker = path / f".update-write-{os.getpid()}"
     try:
         with open(marker, "w", encoding="utf-8") as handle:
@@ -357,12 +644,18 @@ def _can_write_to_dir(path: Path) -> bool:
         return False
 
 
+@lru_cache(maxsize=1)
 def _updates_dir() -> Path:
     updates_dir = DATA_DIR / "updates"
     updates_dir.mkdir(parents=True, exist_ok=True)
     return updates_dir
 
 
+@lru_cache(maxsize=1)
+def _resolved_updates_dir() -> Path:
+    return _updates_dir().resolve()
+
+
 def _normalize_update_path(asset_path: str) -> Path | None:
     if not asset_path or not isinstance(asset_path, str):
         return None
@@ -371,9 +664,8 @@ def _normalize_update_path(asset_path: str) -> Path | None:
         resolved = path.resolve()
     except OSError:
         return None
-    updates_dir = _updates_dir().resolve()
     try:
-        resolved.relative_to(updates_dir)
+        resolved.relative_to(_resolved_updates_dir())
     except ValueError:
         return None
     return resolved
@@ -399,6 +691,115 @@ def _is_windows_installer(path: Path) -> bool:
     return name.endswith(".exe") or name.endswith(".msi")
 
 
+# Helper scripts are kept flush-left so they need no dedent at runtime.
+_WINDOWS_UPDATE_SCRIPT = """\
+param(
+  [int]$ProcessId,
+  [string]$ArchivePath,
+  [string]$TargetDir,
+  [string]$LaunchPath,
+  [string]$StagingDir
+)
+$ErrorActionPreference = "Stop"
+$deadline = (Get-Date).AddSeconds(20)
+while (Get-Process -Id $ProcessId -ErrorAction SilentlyContinue) {
+  if ((Get-Date) -ge $deadline) {
+    Stop-Process -Id $ProcessId -Force -ErrorAction SilentlyContinue
+    break
+  }
+  Start-Sleep -Milliseconds 400
+}
+if (Test-Path $StagingDir) { Remove-Item -Recurse -Force $StagingDir }
+New-Item -ItemType Directory -Path $StagingDir | Out-Null
+Expand-Archive -Path $ArchivePath -DestinationPath $StagingDir -Force
+$items = Get-ChildItem -Path $StagingDir
+if ($items.Count -eq 1 -and $items[0].PSIsContainer) {
+  $source = $items[0].FullName
+} else {
+  $source = $StagingDir
+}
+if (Test-Path $TargetDir) { Remove-Item -Recurse -Force $TargetDir }
+Move-Item -Path $source -Destination $TargetDir
+Start-Process -FilePath $LaunchPath"""
+
+
+_WINDOWS_INSTALLER_SCRIPT = """\
+param(
+  [int]$ProcessId,
+  [string]$InstallerPath,
+  [string]$LaunchPath
+)
+$ErrorActionPreference = "Stop"
+$deadline = (Get-Date).AddSeconds(20)
+while (Get-Process -Id $ProcessId -ErrorAction SilentlyContinue) {
+  if ((Get-Date) -ge $deadline) {
+    Stop-Process -Id $ProcessId -Force -ErrorAction SilentlyContinue
+    break
+  }
+  Start-Sleep -Milliseconds 400
+}
+if ($InstallerPath.ToLower().EndsWith(".msi")) {
+  Start-Process -FilePath "msiexec.exe" -ArgumentList "/i", "`"$InstallerPath`"" -Wait
+} else {
+  Start-Process -FilePath $InstallerPath -Wait
+}
+if (Test-Path $LaunchPath) {
+  Start-Process -FilePath $LaunchPath
+}"""
+
+
+_UNIX_UPDATE_SCRIPT = """\
+#!/bin/sh
+set -eu
+pid="$1"
+archive="$2"
+target="$3"
+launch="$4"
+staging="$5"
+
+timeout=70
+while kill -0 "$pid" 2>/dev/null; do
+  if [ "$timeout" -le 0 ]; then
+    kill -9 "$pid" 2>/dev/null || true
+    break
+  fi
+  timeout=$((timeout - 1))
+  sleep 0.3
+done
+
+rm -rf "$staging"
+mkdir -p "$staging"
+
+case "$archive" in
+  *.tar.gz|*.tgz) tar -xzf "$archive" -C "$staging" ;;
+  *.tar) tar -xf "$archive" -C "$staging" ;;
+  *.zip)
+    if command -v ditto >/dev/null 2>&1; then
+      ditto -x -k "$archive" "$staging"
+    else
+      unzip -q "$archive" -d "$staging"
+    fi
+    ;;
+  *) echo "Unsupported archive" >&2; exit 1 ;;
+esac
+
+source="$staging"
+if [ "$(ls -1 "$staging" | wc -l | tr -d ' ')" -eq 1 ]; then
+  first="$(ls -1 "$staging" | head -n 1)"
+  if [ -d "$staging/$first" ]; then
+    source="$staging/$first"
+  fi
+fi
+
+rm -rf "$target"
+mv "$source" "$target"
+
+case "$launch" in
+  *.app) open "$launch" ;;
+  *) "$launch" >/dev/null 2>&1 & ;;
+esac"""
+
+
 def _write_script(path: Path, content: str) -> None:
     path.write_text(content, encoding="utf-8")
     if not sys.platform.startswith("win"):
@@ -408,126 +809,6 @@ def _write_script(path: Path, content: str) -> None:
             pass
 
 
-def _windows_update_script() -> str:
-    return textwrap.dedent(
-        """
-        param(
-          [int]$ProcessId,
-          [string]$ArchivePath,
-          [string]$TargetDir,
-          [string]$LaunchPath,
-          [string]$StagingDir
-        )
-        $ErrorActionPreference = "Stop"
-        $deadline = (Get-Date).AddSeconds(20)
-        while (Get-Process -Id $ProcessId -ErrorAction SilentlyContinue) {
-          if ((Get-Date) -ge $deadline) {
-            Stop-Process -Id $ProcessId -Force -ErrorAction SilentlyContinue
-            break
-          }
-          Start-Sleep -Milliseconds 400
-        }
-        if (Test-Path $StagingDir) { Remove-Item -Recurse -Force $StagingDir }
-        New-Item -ItemType Directory -Path $StagingDir | Out-Null
-        Expand-Archive -Path $ArchivePath -DestinationPath $StagingDir -Force
-        $items = Get-ChildItem -Path $StagingDir
-        if ($items.Count -eq 1 -and $items[0].PSIsContainer) {
-          $source = $items[0].FullName
-        } else {
-          $source = $StagingDir
-        }
-        if (Test-Path $TargetDir) { Remove-Item -Recurse -Force $TargetDir }
-        Move-Item -Path $source -Destination $TargetDir
-        Start-Process -FilePath $LaunchPath
-        """
-    ).strip()
-
-
-def _windows_installer_script() -> str:
-    return textwrap.dedent(
-        """
-        param(
-          [int]$ProcessId,
-          [string]$InstallerPath,
-          [string]$LaunchPath
-        )
-        $ErrorActionPreference = "Stop"
-        $deadline = (Get-Date).AddSeconds(20)
-        while (Get-Process -Id $ProcessId -ErrorAction SilentlyContinue) {
-          if ((Get-Date) -ge $deadline) {
-            Stop-Process -Id $ProcessId -Force -ErrorAction SilentlyContinue
-            break
-          }
-          Start-Sleep -Milliseconds 400
-        }
-        if ($InstallerPath.ToLower().EndsWith(".msi")) {
-          Start-Process -FilePath "msiexec.exe" -ArgumentList "/i", "`"$InstallerPath`"" -Wait
-        } else {
-          Start-Process -FilePath $InstallerPath -Wait
-        }
-        if (Test-Path $LaunchPath) {
-          Start-Process -FilePath $LaunchPath
-        }
-        """
-    ).strip()
-
-
-def _unix_update_script() -> str:
-    return textwrap.dedent(
-        """
-        #!/bin/sh
-        set -eu
-        pid="$1"
-        archive="$2"
-        target="$3"
-        launch="$4"
-        staging="$5"
-
-        timeout=70
-        while kill -0 "$pid" 2>/dev/null; do
-          if [ "$timeout" -le 0 ]; then
-            kill -9 "$pid" 2>/dev/null || true
-            break
-          fi
-          timeout=$((timeout - 1))
-          sleep 0.3
-        done
-
-        rm -rf "$staging"
-        mkdir -p "$staging"
-
-        case "$archive" in
-          *.tar.gz|*.tgz) tar -xzf "$archive" -C "$staging" ;;
-          *.tar) tar -xf "$archive" -C "$staging" ;;
-          *.zip)
-            if command -v ditto >/dev/null 2>&1; then
-              ditto -x -k "$archive" "$staging"
-            else
-              unzip -q "$archive" -d "$staging"
-            fi
-            ;;
-          *) echo "Unsupported archive" >&2; exit 1 ;;
-        esac
-
-        source="$staging"
-        if [ "$(ls -1 "$staging" | wc -l | tr -d ' ')" -eq 1 ]; then
-          first="$(ls -1 "$staging" | head -n 1)"
-          if [ -d "$staging/$first" ]; then
-            source="$staging/$first"
-          fi
-        fi
-
-        rm -rf "$target"
-        mv "$source" "$target"
-
-        case "$launch" in
-          *.app) open "$launch" ;;
-          *) "$launch" >/dev/null 2>&1 & ;;
-        esac
-        """
-    ).strip()
-
-
 def install_update(asset_path: str) -> dict[str, Any]:
     if not getattr(sys, "frozen", False):
         return {"ok": False, "error": "update install only supported in packaged app"}
@@ -545,7 +826,7 @@ def install_update(asset_path: str) -> dict[str, Any]:
 
     if sys.platform.startswith("win") and _is_windows_installer(resolved_path):
         script_path = updates_dir / f"run-installer-{os.getpid()}.ps1"
-        _write_script(script_path, _windows_installer_script())
+        _write_script(script_path, _WINDOWS_INSTALLER_SCRIPT)
         cmd = [
             "powershell",
             "-NoProfile",
@@ -568,7 +849,7 @@ def install_update(asset_path: str) -> dict[str, Any]:
             }
         if sys.platform.startswith("win"):
             script_path = updates_dir / f"apply-update-{os.getpid()}.ps1"
-            _write_script(script_path, _windows_update_script())
+            _write_script(script_path, _WINDOWS_UPDATE_SCRIPT)
             cmd = [
                 "powershell",
                 "-NoProfile",
@@ -584,7 +865,7 @@ def install_update(asset_path: str) -> dict[str, Any]:
             ]
         else:
             script_path = updates_dir / f"apply-update-{os.getpid()}.sh"
-            _write_script(script_path, _unix_update_script())
+            _write_script(script_path, _UNIX_UPDATE_SCRIPT)
             cmd = [
                 "/bin/sh",
                 str(script_path),
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import atexit
 import os
 import shlex
 import shutil
@@ -7,7 +8,10 @@ import subprocess
 import sys
 import time
 from datetime import datetime, timezone
+from functools import lru_cache
 from pathlib import Path
+from threading import Lock
+from typing import TextIO
 
 from app_info import APP_NAME
 
@@ -17,6 +21,9 @@ LOG_FILENAME = "startup.log"
 
 _START_TIME = time.perf_counter()
 _TERMINAL_OPENED = False
+_LOG_HANDLE: TextIO | None = None
+_LOG_LOCK = Lock()
+_LAST_SECOND: tuple[int, str] = (-1, "")
 
 
 def _default_user_data_dir() -> Path:
@@ -33,7 +40,7 @@ def _default_user_data_dir() -> Path:
     return Path.home() / ".local" / "share" / APP_NAME
 
 
-def _resolve_data_dir() -> Path:
+def resolve_data_dir() -> Path:
     override = os.environ.get(DATA_DIR_ENV)
     if override:
         return Path(override)
@@ -41,7 +48,7 @@ def _resolve_data_dir() -> Path:
 
 
 def _log_path() -> Path:
-    return _resolve_data_dir() / LOG_FILENAME
+    return resolve_data_dir() / LOG_FILENAME
 
 
 def _startup_terminal_enabled() -> bool:
@@ -51,6 +58,24 @@ def _startup_terminal_enabled() -> bool:
     return value.strip().lower() in {"1", "true", "yes", "on"}
 
 
+# Linux emulators tried in order; "{command}" is replaced by the tail command.
+_TERMINAL_CANDIDATES: tuple[tuple[str, tuple[str, ...]], ...] = (
+    ("x-terminal-emulator", ("-e", "sh", "-c", "{command}")),
+    ("gnome-terminal", ("--", "sh", "-c", "{command}")),
+    ("konsole", ("-e", "sh", "-c", "{command}")),
+    ("xfce4-terminal", ("--command", "sh -c {command}")),
+    ("xterm", ("-e", "sh", "-c", "{command}")),
+)
+
+
+@lru_cache(maxsize=1)
+def _detect_terminal() -> tuple[str, tuple[str, ...]] | None:
+    for executable, args in _TERMINAL_CANDIDATES:
+        if shutil.which(executable):
+            return executable, args
+    return None
+
+
 def _open_terminal_tail(path: Path) -> None:
     if sys.platform.startswith("win"):
         ps_path = str(path).replace("'", "''")
@@ -65,19 +90,14 @@ def _open_terminal_tail(path: Path) -> None:
         script = f'tell application "Terminal" to do script "tail -f {quoted}"'
         subprocess.Popen(["osascript", "-e", script])
         return
-    quoted = shlex.quote(str(path))
-    tail_command = f"tail -f {quoted}"
-    candidates = [
-        ("x-terminal-emulator", ["-e", "sh", "-c", tail_command]),
-        ("gnome-terminal", ["--", "sh", "-c", tail_command]),
-        ("konsole", ["-e", "sh", "-c", tail_command]),
-        ("xfce4-terminal", ["--command", f"sh -c {tail_command}"]),
-        ("xterm", ["-e", "sh", "-c", tail_command]),
-    ]
-    for executable, args in candidates:
-        if shutil.which(executable):
-            subprocess.Popen([executable, *args])
-            return
+    terminal = _detect_terminal()
+    if terminal is None:
+        return
+    executable, args = terminal
+    tail_command = f"tail -f {shlex.quote(str(path))}"
+    subprocess.Popen(
+        [executable, *(arg.format(command=tail_command) for arg in args)]
+    )
 
 
 def launch_startup_terminal() -> None:
@@ -94,14 +114,36 @@ def launch_startup_terminal() -> None:
         pass
 
 
+def _utc_timestamp() -> str:
+    # Same text as datetime.now(timezone.utc).isoformat(), but the date and
+    # time part is formatted once per second; startup logs come in bursts.
+    global _LAST_SECOND
+    second, micros = divmod(time.time_ns() // 1000, 1_000_000)
+    cached_second, prefix = _LAST_SECOND
+    if second != cached_second:
+        prefix = datetime.fromtimestamp(second, timezone.utc).strftime(
+            "%Y-%m-%dT%H:%M:%S"
+        )
+        _LAST_SECOND = (second, prefix)
+    if not micros:
+        return f"{prefix}+00:00"
+    return f"{prefix}.{micros:06d}+00:00"
+
+
 def log_startup(label: str) -> None:
+    global _LOG_HANDLE
     elapsed_ms = (time.perf_counter() - _START_TIME) * 1000
-    timestamp = datetime.now(timezone.utc).isoformat()
+    timestamp = _utc_timestamp()
     line = f"{timestamp} {elapsed_ms:.1f}ms {label}\n"
     try:
-        path = _log_path()
-        path.parent.mkdir(parents=True, exist_ok=True)
-        with path.open("a", encoding="utf-8") as handle:
-            handle.write(line)
+        with _LOG_LOCK:
+            # Opened once and kept line-buffered, so each label is a single
+            # write that `tail -f` still sees immediately.
+            if _LOG_HANDLE is None:
+                path = _log_path()
+                path.parent.mkdir(parents=True, exist_ok=True)
+                _LOG_HANDLE = path.open("a", encoding="utf-8", buffering=1)
+                atexit.register(_LOG_HANDLE.close)
+            _LOG_HANDLE.write(line)
     except Exception:
         pass
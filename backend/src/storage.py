@@ -1,45 +1,92 @@
 from __future__ import annotations
 
-import json
+import atexit
 import os
 import shutil
+import sqlite3
 import sys
-from datetime import datetime
+import threading
+import zlib
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from functools import lru_cache
+from hashlib import blake2b
 from pathlib import Path
+from typing import Iterator
 from uuid import uuid4
 
-from peewee import CharField, DateTimeField, Model, SqliteDatabase, TextField
-
-from app_info import APP_NAME
-from startup_log import log_startup
-
-DATA_DIR_ENV = "PARAIMAGE_DATA_DIR"
-
-
-def _default_user_data_dir() -> Path:
-    if sys.platform.startswith("win"):
-        base = os.environ.get("APPDATA") or os.environ.get("LOCALAPPDATA")
-        if base:
-            return Path(base) / APP_NAME
-        return Path.home() / "AppData" / "Roaming" / APP_NAME
-    if sys.platform == "darwin":
-        return Path.home() / "Library" / "Application Support" / APP_NAME
-    base = os.environ.get("XDG_DATA_HOME")
-    if base:
-        return Path(base) / APP_NAME
-    return Path.home() / ".local" / "share" / APP_NAME
-
-
-def _resolve_data_dir() -> Path:
-    override = os.environ.get(DATA_DIR_ENV)
-    if override:
-        return Path(override)
-    return _default_user_data_dir()
-
-
-DATA_DIR = _resolve_data_dir()
+import orjson
+from peewee import (
+    BlobField,
+    CharField,
+    CompositeKey,
+    DateTimeField,
+    IntegerField,
+    Model,
+    TextField,
+    chunked,
+)
+from playhouse.pool import PooledSqliteDatabase
+
+from startup_log import log_startup, resolve_data_dir
+
+DATA_DIR = resolve_data_dir()
 DB_PATH = DATA_DIR / "paraimage.db"
-database = SqliteDatabase(DB_PATH)
+# Provider results written to disk when PARAIMAGE_IMAGE_FILE_OUTPUT is set.
+GENERATED_IMAGES_DIR = DATA_DIR / "generated"
+# pywebview runs every js_api call on a fresh thread, so thread-local
+# connections would be opened (and their page and statement caches warmed)
+# once per call. A small pool hands warm connections from thread to thread;
+# each one is still used by a single thread at a time.
+database = PooledSqliteDatabase(
+    DB_PATH,
+    max_connections=8,
+    timeout=30,
+    check_same_thread=False,
+    # Every query must run inside _connection(): an implicit connect would
+    # check a connection out on the calling js_api thread and never return
+    # it, and eight such leaks exhaust the pool.
+    autoconnect=False,
+    # RETURNING (SQLite 3.35+) lets an upsert hand back the stored row.
+    returning_clause=sqlite3.sqlite_version_info >= (3, 35, 0),
+    pragmas={
+        "journal_mode": "wal",
+        "synchronous": "normal",
+        "cache_size": -20000,
+        "temp_store": "memory",
+        # Reads come straight from the mapped file instead of being copied
+        # through read() into the page cache.
+        "mmap_size": 256 * 1024 * 1024,
+    },
+    # Peewee emits identical SQL text for repeated list/upsert calls, so a
+    # larger sqlite3 statement cache lets those skip re-preparing.
+    cached_statements=256,
+)
+
+# Peewee hands every thread its own connection, and WAL lets those readers
+# run alongside a writer. Writes are funnelled through a single lock so
+# concurrent IPC calls queue up here instead of failing with SQLITE_BUSY.
+_WRITE_LOCK = threading.RLock()
+
+
+def _utcnow() -> datetime:
+    # Naive UTC, matching the values already stored, without the deprecated
+    # datetime.utcnow().
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+@lru_cache(maxsize=64)
+def _parse_json_list(raw: str) -> tuple:
+    # model_ids and the prompt library are re-read far more often than they
+    # change. The tuple only stops callers resizing the cached sequence; the
+    # entries themselves are shared, so mutable ones (prompt dicts) must be
+    # copied before they are handed out.
+    try:
+        payload = orjson.loads(raw)
+    except (orjson.JSONDecodeError, TypeError):
+        return ()
+    return tuple(payload) if isinstance(payload, list) else ()
 
 
 class BaseModel(Model):
@@ -52,46 +99,74 @@ class Settings(BaseModel):
     api_key = CharField()
     base_url = CharField()
     model_ids = TextField(default="[]")
-    updated_at = DateTimeField(default=datetime.utcnow)
+    updated_at = DateTimeField(default=_utcnow)
 
     def get_model_ids(self) -> list[str]:
         """Parse model_ids JSON string to list"""
-        try:
-            return json.loads(self.model_ids) if self.model_ids else []
-        except (json.JSONDecodeError, TypeError):
-            return []
+        return list(_parse_json_list(self.model_ids)) if self.model_ids else []
 
     def set_model_ids(self, model_ids: list[str]) -> None:
         """Store model_ids as JSON string"""
-        self.model_ids = json.dumps(model_ids)
+        self.model_ids = orjson.dumps(model_ids).decode()
 
 
 class ChatSession(BaseModel):
     session_id = CharField(unique=True)
     model_id = CharField()
     title = CharField(default="")
+    # Legacy inline JSON; messages now live in ChatMessage rows. init_db
+    # copies older blobs there once and leaves this column untouched.
     messages = TextField(default="[]")
-    created_at = DateTimeField(default=datetime.utcnow)
-    updated_at = DateTimeField(default=datetime.utcnow)
+    created_at = DateTimeField(default=_utcnow)
+    updated_at = DateTimeField(default=_utcnow)
+
+    class Meta:
+        # Serves iter_chat_sessions' filter and its updated_at ordering
+        # (scanned backwards) without a table scan or sort.
+        indexes = ((("model_id", "updated_at"), False),)
 
     def get_messages(self) -> list[dict]:
-        try:
-            return json.loads(self.messages) if self.messages else []
-        except (json.JSONDecodeError, TypeError):
-            return []
+        cached = getattr(self, "_messages_cache", None)
+        if cached is not None:
+            return cached
+        with _connection():
+            rows = (
+                ChatMessage.select(ChatMessage.payload)
+                .where(ChatMessage.session_id == self.session_id)
+                .order_by(ChatMessage.seq)
+                .tuples()
+            )
+            messages = [_decode_message(payload) for (payload,) in rows]
+        self._messages_cache = messages
+        return messages
+
 
-    def set_messages(self, messages: list[dict]) -> None:
-        self.messages = json.dumps(messages, ensure_ascii=False)
+class ChatMessage(BaseModel):
+    # One row per message, so saving a chat only writes the turns that
+    # changed instead of re-serializing the whole history (which carries
+    # base64 images) on every save.
+    session_id = CharField()
+    seq = IntegerField()
+    digest = CharField()
+    payload = BlobField()
+
+    class Meta:
+        primary_key = CompositeKey("session_id", "seq")
 
 
 class AppSetting(BaseModel):
     key = CharField(unique=True)
     value = TextField(default="")
-    updated_at = DateTimeField(default=datetime.utcnow)
+    updated_at = DateTimeField(default=_utcnow)
 
 
 PROMPT_LIBRARY_KEY = "prompt_library"
 PROMPT_LIBRARY_PATH_ENV = "PARAIMAGE_PROMPT_LIBRARY_PATH"
+# Stored in SQLite's user_version header field. Databases at this version
+# have had the one-off migrations in init_db applied, so later launches skip
+# them: 1 = model_ids column and legacy custom providers, 2 = inline chat
+# messages copied into ChatMessage.
+_SCHEMA_VERSION = 2
 
 
 def _migrate_legacy_db_path() -> None:
@@ -169,12 +244,22 @@ def _migrate_legacy_data_dir() -> None:
 
 
 def _build_prompt_title(content: str) -> str:
+    # Collapsing a prefix yields a prefix of the fully collapsed text, so a
+    # long prompt only has its head split and joined.
+    head = " ".join(content[:128].split())
+    if len(head) > 24:
+        return f"{head[:24]}..."
     trimmed = " ".join(content.split())
     if not trimmed:
         return "Untitled prompt"
     return trimmed if len(trimmed) <= 24 else f"{trimmed[:24]}..."
 
 
+def _str_value(item: dict, key: str, default: str) -> str:
+    value = item.get(key)
+    return value if isinstance(value, str) else default
+
+
 def _normalize_prompt_item(item: object, now: str) -> dict | None:
     if isinstance(item, str):
         content = item.strip()
@@ -189,27 +274,20 @@ def _normalize_prompt_item(item: object, now: str) -> dict | None:
         }
     if not isinstance(item, dict):
         return None
-    content_raw = (
-        item.get("content")
-        if isinstance(item.get("content"), str)
-        else item.get("prompt")
-        if isinstance(item.get("prompt"), str)
-        else item.get("text")
-        if isinstance(item.get("text"), str)
-        else ""
-    )
-    content = content_raw.strip() if isinstance(content_raw, str) else ""
+    # The first of content/prompt/text that holds a string wins, even if
+    # it turns out blank.
+    content = ""
+    for key in ("content", "prompt", "text"):
+        value = item.get(key)
+        if isinstance(value, str):
+            content = value.strip()
+            break
     if not content:
         return None
-    title_raw = item.get("title") if isinstance(item.get("title"), str) else ""
-    title = title_raw.strip() if isinstance(title_raw, str) else ""
-    if not title:
-        title = _build_prompt_title(content)
-    prompt_id = item.get("id") if isinstance(item.get("id"), str) else ""
-    if not prompt_id:
-        prompt_id = f"prompt-{uuid4().hex}"
-    created_at = item.get("createdAt") if isinstance(item.get("createdAt"), str) else now
-    updated_at = item.get("updatedAt") if isinstance(item.get("updatedAt"), str) else now
+    title = _str_value(item, "title", "").strip() or _build_prompt_title(content)
+    prompt_id = _str_value(item, "id", "") or f"prompt-{uuid4().hex}"
+    created_at = _str_value(item, "createdAt", now)
+    updated_at = _str_value(item, "updatedAt", now)
     return {
         "id": prompt_id,
         "title": title,
@@ -230,7 +308,7 @@ def _parse_prompt_library_payload(payload: object) -> list[dict]:
         items = payload
     else:
         return []
-    now = datetime.utcnow().isoformat()
+    now = _utcnow().isoformat()
     normalized: list[dict] = []
     for item in items:
         prompt_item = _normalize_prompt_item(item, now)
@@ -239,30 +317,34 @@ def _parse_prompt_library_payload(payload: object) -> list[dict]:
     return normalized
 
 
-def _load_default_prompt_library() -> list[dict]:
-    candidates: list[Path] = []
+def _prompt_library_candidates() -> Iterator[Path]:
+    # Lazy, so a hit on an early candidate skips resolving the later ones.
     env_path = os.environ.get(PROMPT_LIBRARY_PATH_ENV)
     if env_path:
-        candidates.append(Path(env_path))
+        yield Path(env_path)
     if getattr(sys, "_MEIPASS", None):
-        candidates.append(Path(sys._MEIPASS) / "prompt-library.json")
-    candidates.extend(
-        [
-            Path(__file__).resolve().parent.parent.parent / "prompt-library.json",
-            DATA_DIR / "prompt-library.json",
-            Path.cwd() / "prompt-library.json",
-        ]
-    )
-    for path in candidates:
+        yield Path(sys._MEIPASS) / "prompt-library.json"
+    yield Path(__file__).resolve().parent.parent.parent / "prompt-library.json"
+    yield DATA_DIR / "prompt-library.json"
+    yield Path.cwd() / "prompt-library.json"
+
+
+def _load_default_prompt_library() -> list[dict]:
+    seen: set[Path] = set()
+    for path in _prompt_library_candidates():
+        path = path.absolute()
+        if path in seen:
+            continue
+        seen.add(path)
         try:
-            if not path.is_file():
-                continue
-            raw = path.read_text(encoding="utf-8")
-        except Exception:
+            # A single open; a missing file or a directory lands here too.
+            # orjson parses the UTF-8 bytes directly; no interim str.
+            raw = path.read_bytes()
+        except (OSError, ValueError):
             continue
         try:
-            payload = json.loads(raw)
-        except (json.JSONDecodeError, TypeError):
+            payload = orjson.loads(raw)
+        except (orjson.JSONDecodeError, TypeError):
             continue
         prompts = _parse_prompt_library_payload(payload)
         if prompts:
@@ -285,27 +367,111 @@ def init_db() -> None:
     log_startup("data_dir_ready")
     _migrate_legacy_data_dir()
     _migrate_legacy_db_path()
-    database.connect(reuse_if_open=True)
-    log_startup("db_connected")
-    database.create_tables(
-        [Settings, ChatSession, AppSetting], safe=True
+    with _connection():
+        log_startup("db_connected")
+        database.create_tables(
+            [Settings, ChatSession, ChatMessage, AppSetting], safe=True
+        )
+        log_startup("db_tables_ready")
+        schema_version = _schema_version()
+        if schema_version < 1:
+            _ensure_settings_model_ids_column()
+            _migrate_legacy_custom_providers()
+        if schema_version < 2:
+            _migrate_inline_chat_messages()
+        if schema_version < _SCHEMA_VERSION:
+            database.execute_sql(f"PRAGMA user_version = {_SCHEMA_VERSION}")
+        log_startup("db_migrations_done")
+        _seed_prompt_library()
+        log_startup("prompt_library_seeded")
+        _prune_generated_images()
+    atexit.register(_optimize_db)
+
+
+def _optimize_db() -> None:
+    # Refresh planner statistics for tables whose shape changed this run,
+    # e.g. as chat messages accumulate. Cheap when nothing changed.
+    try:
+        with _connection():
+            database.execute_sql("PRAGMA optimize")
+    except Exception:
+        pass
+
+
+@contextmanager
+def _connection():
+    # Borrow a pooled connection for this thread and return it afterwards;
+    # nested calls reuse the one already held.
+    if not database.is_closed():
+        yield
+        return
+    database.connect()
+    try:
+        yield
+    finally:
+        database.close()
+
+
+@contextmanager
+def _write_transaction():
+    with _connection(), _WRITE_LOCK, database.atomic(lock_type="IMMEDIATE"):
+        yield
+
+
+# Hot single-row lookups skip peewee's query builder (most of the cost of
+# get_or_none); the constant text also hits sqlite3's statement cache.
+_GET_SETTINGS_SQL = (
+    "SELECT id, provider_name, api_key, base_url, model_ids, updated_at "
+    "FROM settings WHERE provider_name = ?"
+)
+_GET_APP_SETTING_SQL = (
+    "SELECT id, key, value, updated_at FROM appsetting WHERE key = ?"
+)
+_GET_APP_SETTING_STAMP_SQL = "SELECT updated_at FROM appsetting WHERE key = ?"
+_LIST_SETTINGS_SQL = (
+    "SELECT id, provider_name, api_key, base_url, model_ids, updated_at "
+    "FROM settings ORDER BY updated_at DESC"
+)
+# The legacy inline messages column is left out; see ChatMessage.
+_LIST_CHAT_SESSIONS_SQL = (
+    "SELECT id, session_id, model_id, title, created_at, updated_at "
+    "FROM chatsession WHERE model_id = ? ORDER BY updated_at DESC"
+)
+_LIST_CHAT_MESSAGES_SQL = (
+    "SELECT m.session_id, m.payload FROM chatmessage AS m "
+    "JOIN chatsession AS s ON s.session_id = m.session_id "
+    "WHERE s.model_id = ? ORDER BY m.session_id, m.seq"
+)
+
+# (raw updated_at, decoded prompts) of the last prompt library read.
+_PROMPT_LIBRARY_CACHE: tuple[str | None, tuple] = (None, ())
+
+
+def _upsert(model, conflict_field, values: dict, preserve: list, fields=None):
+    # INSERT ... ON CONFLICT DO UPDATE in one statement instead of a lookup
+    # followed by save(); `preserve` lists the columns taken from `values`
+    # when the row already exists, and `fields` narrows the row read back.
+    query = model.insert(**values).on_conflict(
+        conflict_target=[conflict_field], preserve=preserve
+    )
+    fields = fields or [model]
+    if database.returning_clause:
+        return next(iter(query.returning(*fields).execute()))
+    query.execute()
+    return (
+        model.select(*fields)
+        .where(conflict_field == values[conflict_field.name])
+        .get()
     )
-    log_startup("db_tables_ready")
-    _ensure_settings_model_ids_column()
-    _migrate_legacy_custom_providers()
-    log_startup("db_migrations_done")
-    _seed_prompt_library()
-    log_startup("prompt_library_seeded")
 
 
-def ensure_db() -> None:
-    if database.is_closed():
-        database.connect(reuse_if_open=True)
+def iter_settings() -> Iterator[Settings]:
+    with _connection():
+        yield from Settings.raw(_LIST_SETTINGS_SQL).iterator()
 
 
 def list_settings() -> list[Settings]:
-    ensure_db()
-    return list(Settings.select().order_by(Settings.updated_at.desc()))
+    return list(iter_settings())
 
 
 def save_settings(
@@ -314,28 +480,31 @@ def save_settings(
     base_url: str,
     model_ids: list[str] | None = None,
 ) -> Settings:
-    ensure_db()
-    existing = Settings.get_or_none(Settings.provider_name == provider_name)
-    if existing:
-        existing.api_key = api_key
-        existing.base_url = base_url
-        if model_ids is not None:
-            existing.set_model_ids(model_ids)
-        existing.updated_at = datetime.utcnow()
-        existing.save()
-        return existing
-    return Settings.create(
-        provider_name=provider_name,
-        api_key=api_key,
-        base_url=base_url,
-        model_ids=json.dumps(model_ids or []),
-        updated_at=datetime.utcnow(),
-    )
+    preserve = [Settings.api_key, Settings.base_url, Settings.updated_at]
+    if model_ids is not None:
+        preserve.append(Settings.model_ids)
+    with _write_transaction():
+        return _upsert(
+            Settings,
+            Settings.provider_name,
+            {
+                "provider_name": provider_name,
+                "api_key": api_key,
+                "base_url": base_url,
+                "model_ids": orjson.dumps(model_ids or []).decode(),
+                "updated_at": _utcnow(),
+            },
+            preserve,
+        )
 
 
 def get_settings(provider_name: str) -> Settings | None:
-    ensure_db()
-    return Settings.get_or_none(Settings.provider_name == provider_name)
+    with _connection():
+        return next(iter(Settings.raw(_GET_SETTINGS_SQL, provider_name)), None)
+
+
+def _schema_version() -> int:
+    return database.execute_sql("PRAGMA user_version").fetchone()[0]
 
 
 def _ensure_settings_model_ids_column() -> None:
@@ -375,130 +544,292 @@ def _migrate_legacy_custom_providers() -> None:
     if not rows:
         return
 
-    for provider_name, api_key, base_url, model_ids in rows:
-        if not provider_name:
-            continue
+    # One write transaction for the whole migration. Existing providers are
+    # fetched in one query and saved once each; new ones are bulk-inserted.
+    names = {provider_name for provider_name, *_ in rows if provider_name}
+    existing_by_name = {
+        record.provider_name: record
+        for record in Settings.select().where(Settings.provider_name.in_(names))
+    }
+    changed: dict[str, Settings] = {}
+    pending: dict[str, dict] = {}
+    now = _utcnow()
+    with _write_transaction():
+        for provider_name, api_key, base_url, model_ids in rows:
+            if not provider_name:
+                continue
+            try:
+                parsed_model_ids = (
+                    orjson.loads(model_ids) if model_ids else []
+                )
+            except (orjson.JSONDecodeError, TypeError):
+                parsed_model_ids = []
+
+            new_row = pending.get(provider_name)
+            if new_row is not None:
+                if api_key and not new_row["api_key"]:
+                    new_row["api_key"] = api_key
+                if base_url and not new_row["base_url"]:
+                    new_row["base_url"] = base_url
+                if parsed_model_ids and new_row["model_ids"] == "[]":
+                    new_row["model_ids"] = orjson.dumps(parsed_model_ids).decode()
+                continue
+
+            existing = existing_by_name.get(provider_name)
+            if existing:
+                if api_key and not existing.api_key:
+                    existing.api_key = api_key
+                    changed[provider_name] = existing
+                if base_url and not existing.base_url:
+                    existing.base_url = base_url
+                    changed[provider_name] = existing
+                if parsed_model_ids and not existing.get_model_ids():
+                    existing.set_model_ids(parsed_model_ids)
+                    changed[provider_name] = existing
+                continue
+
+            pending[provider_name] = {
+                "provider_name": provider_name,
+                "api_key": api_key or "",
+                "base_url": base_url or "",
+                "model_ids": orjson.dumps(parsed_model_ids).decode(),
+                "updated_at": now,
+            }
+        for record in changed.values():
+            record.updated_at = now
+            record.save()
+        for batch in chunked(list(pending.values()), 100):
+            Settings.insert_many(batch).execute()
+
+
+# ChatMessage.payload starts with a format byte: raw JSON, or JSON deflated
+# with zlib once it is large enough for that to pay off.
+_MESSAGE_RAW = b"\x00"
+_MESSAGE_ZLIB = b"\x01"
+_MESSAGE_COMPRESS_MIN = 256
+
+
+def _encode_message(raw: bytes) -> bytes:
+    if len(raw) < _MESSAGE_COMPRESS_MIN:
+        return _MESSAGE_RAW + raw
+    return _MESSAGE_ZLIB + zlib.compress(raw, 1)
+
+
+def _decode_message(payload: bytes | str) -> object:
+    if isinstance(payload, str):
+        return orjson.loads(payload)
+    data = memoryview(payload)[1:]
+    if payload[:1] == _MESSAGE_ZLIB:
+        return orjson.loads(zlib.decompress(data))
+    return orjson.loads(data)
+
+
+def _store_messages(session_id: str, messages: list[dict]) -> None:
+    # Keep the stored prefix that still matches and rewrite from the first
+    # changed turn; a new turn in a long chat is a single insert.
+    raw_messages = [orjson.dumps(message) for message in messages]
+    digests = [
+        blake2b(raw, digest_size=16).hexdigest() for raw in raw_messages
+    ]
+    stored = [
+        digest
+        for (digest,) in ChatMessage.select(ChatMessage.digest)
+        .where(ChatMessage.session_id == session_id)
+        .order_by(ChatMessage.seq)
+        .tuples()
+    ]
+    keep = 0
+    limit = min(len(stored), len(digests))
+    while keep < limit and stored[keep] == digests[keep]:
+        keep += 1
+    if keep < len(stored):
+        ChatMessage.delete().where(
+            (ChatMessage.session_id == session_id) & (ChatMessage.seq >= keep)
+        ).execute()
+    rows = [
+        {
+            "session_id": session_id,
+            "seq": seq,
+            "digest": digests[seq],
+            "payload": _encode_message(raw_messages[seq]),
+        }
+        for seq in range(keep, len(raw_messages))
+    ]
+    for batch in chunked(rows, 100):
+        ChatMessage.insert_many(batch).execute()
+
+
+def _migrate_inline_chat_messages() -> None:
+    # Copies only: the inline column is left as written so an older build
+    # still finds its history after a downgrade.
+    legacy = list(
+        ChatSession.select(ChatSession.session_id, ChatSession.messages)
+        .where(ChatSession.messages.not_in(["", "[]"]))
+        .tuples()
+    )
+    if not legacy:
+        return
+    with _write_transaction():
+        for session_id, raw in legacy:
+            try:
+                messages = orjson.loads(raw)
+            except (orjson.JSONDecodeError, TypeError):
+                continue
+            if isinstance(messages, list):
+                _store_messages(session_id, messages)
+
+
+def _message_json(payload: bytes | str) -> bytes:
+    if isinstance(payload, str):
+        return payload.encode("utf-8")
+    if payload[:1] == _MESSAGE_ZLIB:
+        return zlib.decompress(memoryview(payload)[1:])
+    return bytes(payload[1:])
+
+
+def _prune_generated_images() -> None:
+    # Generated files outlive the request only while a saved chat message
+    # still points at them; anything else left from earlier runs goes.
+    try:
+        with os.scandir(GENERATED_IMAGES_DIR) as entries:
+            names = {entry.name for entry in entries if entry.is_file()}
+    except OSError:
+        return
+    if not names:
+        return
+    payloads = ChatMessage.select(ChatMessage.payload).tuples().iterator()
+    for (payload,) in payloads:
         try:
-            parsed_model_ids = (
-                json.loads(model_ids) if model_ids else []
-            )
-        except (json.JSONDecodeError, TypeError):
-            parsed_model_ids = []
-
-        existing = Settings.get_or_none(Settings.provider_name == provider_name)
-        if existing:
-            updated = False
-            if api_key and not existing.api_key:
-                existing.api_key = api_key
-                updated = True
-            if base_url and not existing.base_url:
-                existing.base_url = base_url
-                updated = True
-            if parsed_model_ids and not existing.get_model_ids():
-                existing.set_model_ids(parsed_model_ids)
-                updated = True
-            if updated:
-                existing.updated_at = datetime.utcnow()
-                existing.save()
+            raw = _message_json(payload)
+        except zlib.error:
+            continue
+        if b"file:" not in raw:
             continue
+        names = {name for name in names if name.encode() not in raw}
+        if not names:
+            return
+    for name in names:
+        try:
+            (GENERATED_IMAGES_DIR / name).unlink()
+        except OSError:
+            pass
 
-        Settings.create(
-            provider_name=provider_name,
-            api_key=api_key or "",
-            base_url=base_url or "",
-            model_ids=json.dumps(parsed_model_ids),
-            updated_at=datetime.utcnow(),
-        )
+
+def iter_chat_sessions(model_id: str) -> Iterator[ChatSession]:
+    with _connection():
+        # All of the model's messages in one query, grouped per session.
+        grouped: defaultdict[str, list[dict]] = defaultdict(list)
+        cursor = database.execute_sql(_LIST_CHAT_MESSAGES_SQL, (model_id,))
+        for session_id, payload in cursor:
+            grouped[session_id].append(_decode_message(payload))
+        sessions = ChatSession.raw(_LIST_CHAT_SESSIONS_SQL, model_id)
+        for record in sessions.iterator():
+            record._messages_cache = grouped.get(record.session_id, [])
+            yield record
 
 
 def list_chat_sessions(model_id: str) -> list[ChatSession]:
-    ensure_db()
-    return list(
-        ChatSession.select()
-        .where(ChatSession.model_id == model_id)
-        .order_by(ChatSession.updated_at.desc())
-    )
+    return list(iter_chat_sessions(model_id))
 
 
 def delete_chat_session(session_id: str) -> bool:
-    ensure_db()
     if not session_id:
         return False
-    deleted = (
-        ChatSession.delete()
-        .where(ChatSession.session_id == session_id)
-        .execute()
-    )
+    with _write_transaction():
+        deleted = (
+            ChatSession.delete()
+            .where(ChatSession.session_id == session_id)
+            .execute()
+        )
+        ChatMessage.delete().where(ChatMessage.session_id == session_id).execute()
     return deleted > 0
 
 
+_CHAT_SESSION_FIELDS = [
+    ChatSession.id,
+    ChatSession.session_id,
+    ChatSession.model_id,
+    ChatSession.title,
+    ChatSession.created_at,
+    ChatSession.updated_at,
+]
+
+
 def upsert_chat_session(
     session_id: str,
     model_id: str,
     title: str,
     messages: list[dict],
 ) -> ChatSession:
-    ensure_db()
-    now = datetime.utcnow()
-    existing = ChatSession.get_or_none(ChatSession.session_id == session_id)
-    if existing:
-        existing.model_id = model_id
-        existing.title = title
-        existing.set_messages(messages)
-        existing.updated_at = now
-        existing.save()
-        return existing
-    record = ChatSession(
-        session_id=session_id,
-        model_id=model_id,
-        title=title,
-        created_at=now,
-        updated_at=now,
-    )
-    record.set_messages(messages)
-    record.save()
+    now = _utcnow()
+    with _write_transaction():
+        record = _upsert(
+            ChatSession,
+            ChatSession.session_id,
+            {
+                "session_id": session_id,
+                "model_id": model_id,
+                "title": title,
+                "created_at": now,
+                "updated_at": now,
+            },
+            [ChatSession.model_id, ChatSession.title, ChatSession.updated_at],
+            # Not the legacy inline messages column, which can hold a whole
+            # migrated history.
+            _CHAT_SESSION_FIELDS,
+        )
+        _store_messages(session_id, messages)
+    record._messages_cache = messages
     return record
 
 
 def get_app_setting(key: str) -> AppSetting | None:
-    ensure_db()
-    return AppSetting.get_or_none(AppSetting.key == key)
+    with _connection():
+        return next(iter(AppSetting.raw(_GET_APP_SETTING_SQL, key)), None)
 
 
 def set_app_setting(key: str, value: str) -> AppSetting:
-    ensure_db()
-    record = AppSetting.get_or_none(AppSetting.key == key)
-    if record:
-        record.value = value
-        record.updated_at = datetime.utcnow()
-        record.save()
-        return record
-    return AppSetting.create(
-        key=key,
-        value=value,
-        updated_at=datetime.utcnow(),
-    )
+    with _write_transaction():
+        return _upsert(
+            AppSetting,
+            AppSetting.key,
+            {"key": key, "value": value, "updated_at": _utcnow()},
+            [AppSetting.value, AppSetting.updated_at],
+        )
+
+
+def _copy_prompts(prompts: tuple) -> list:
+    # Prompt entries are flat dicts of strings, so shallow copies keep
+    # callers from editing the cached library.
+    return [dict(item) if isinstance(item, dict) else item for item in prompts]
 
 
 def get_prompt_library() -> list[dict]:
-    record = get_app_setting(PROMPT_LIBRARY_KEY)
+    global _PROMPT_LIBRARY_CACHE
+    with _connection():
+        # Check the row's timestamp first so an unchanged library is neither
+        # read out of SQLite nor decoded again.
+        row = database.execute_sql(
+            _GET_APP_SETTING_STAMP_SQL, (PROMPT_LIBRARY_KEY,)
+        ).fetchone()
+        stamp, cached = _PROMPT_LIBRARY_CACHE
+        if row is not None and row[0] == stamp:
+            return _copy_prompts(cached)
+        record = get_app_setting(PROMPT_LIBRARY_KEY)
     if not record or not record.value:
         prompts = _load_default_prompt_library()
         if prompts:
             set_prompt_library(prompts)
             return prompts
         return []
-    try:
-        payload = json.loads(record.value)
-    except (json.JSONDecodeError, TypeError):
-        return []
-    if isinstance(payload, list):
-        return payload
-    return []
+    prompts = _parse_json_list(record.value)
+    if row is not None:
+        _PROMPT_LIBRARY_CACHE = (row[0], prompts)
+    return _copy_prompts(prompts)
 
 
 def set_prompt_library(prompts: list[dict]) -> AppSetting:
     return set_app_setting(
         PROMPT_LIBRARY_KEY,
-        json.dumps(prompts, ensure_ascii=False),
+        orjson.dumps(prompts).decode(),
     )
@@ -1,10 +1,22 @@
 from __future__ import annotations
 
+import io
 import os
-from typing import Any, Sequence
+import re
+import zlib
+from functools import lru_cache
+from typing import Any, NamedTuple, Sequence
 from urllib.parse import urlparse, urlunparse
+from urllib.request import getproxies, proxy_bypass
+from uuid import uuid4
+
+import orjson
+import pybase64
+import urllib3
+from PIL import Image, ImageOps
 
 from schemas import ImageReference
+from storage import GENERATED_IMAGES_DIR
 
 DEFAULT_SEEDREAM_BASE_URL = "https://ark.cn-beijing.volces.com/api/v3"
 DEFAULT_OPENAI_BASE_URL = "https://api.openai.com/v1"
@@ -18,31 +30,55 @@ GEMINI_PROVIDER_HINTS = ("gemini", "google")
 DASHSCOPE_PROVIDER_HINTS = ("qwen", "dashscope", "aliyun", "alibaba")
 AIHUBMIX_PROVIDER_HINTS = ("aihubmix",)
 VOLCENGINE_PROVIDER_HINTS = ("volcengine", "volc", "ark", "doubao", "bytedance")
+_PROVIDER_HINT_GROUPS = (
+    ("seedream", SEEDREAM_PROVIDER_HINTS),
+    ("openai", OPENAI_PROVIDER_HINTS),
+    ("gemini", GEMINI_PROVIDER_HINTS),
+    ("dashscope", DASHSCOPE_PROVIDER_HINTS),
+    ("aihubmix", AIHUBMIX_PROVIDER_HINTS),
+    ("volcengine", VOLCENGINE_PROVIDER_HINTS),
+)
+MAX_REFERENCE_PX_ENV = "PARAIMAGE_MAX_REFERENCE_PX"
+DEFAULT_MAX_REFERENCE_PX = 1536
+IMAGE_FILE_OUTPUT_ENV = "PARAIMAGE_IMAGE_FILE_OUTPUT"
+GENERATED_IMAGE_EXTENSIONS = {
+    "image/png": ".png",
+    "image/jpeg": ".jpg",
+    "image/webp": ".webp",
+    "image/gif": ".gif",
+}
 VOLCENGINE_MODEL_ALIASES = {
     "doubao-seedream-4.0": "doubao-seedream-4-0-250828",
     "doubao-seedream-4-0": "doubao-seedream-4-0-250828",
     "doubao-seedream-4.5": "doubao-seedream-4-5-251128",
     "doubao-seedream-4-5": "doubao-seedream-4-5-251128",
 }
+_XML_ESCAPES = str.maketrans(
+    {
+        "&": "&amp;",
+        "<": "&lt;",
+        ">": "&gt;",
+        '"': "&quot;",
+        "'": "&apos;",
+    }
+)
+_IMAGES_ENDPOINT = "/images/generations"
+_SIZE_WIDTH_RE = re.compile(r"([+-]?\d+(?:_\d+)*)\s*(?:x|$)")
+_PLACEHOLDER_PALETTE = ("#0f172a", "#1e293b", "#1f2937", "#1e3a8a")
+_PLACEHOLDER_ACCENT = ("#38bdf8", "#22c55e", "#f97316", "#f43f5e")
 
 
 
 def escape_xml(value: str) -> str:
-    return (
-        value.replace("&", "&amp;")
-        .replace("<", "&lt;")
-        .replace(">", "&gt;")
-        .replace('"', "&quot;")
-        .replace("'", "&apos;")
-    )
+    return value.translate(_XML_ESCAPES)
 
 
+@lru_cache(maxsize=128)
 def placeholder_svg(label: str, prompt: str, size: int = 512) -> str:
-    palette = ["#0f172a", "#1e293b", "#1f2937", "#1e3a8a"]
-    accent = ["#38bdf8", "#22c55e", "#f97316", "#f43f5e"]
-    index = sum(ord(ch) for ch in label) % len(palette)
-    bg = palette[index]
-    fg = accent[index]
+    # crc32 rather than hash() so a label keeps its colour across launches.
+    index = zlib.crc32(label.encode("utf-8", "surrogatepass")) & 3
+    bg = _PLACEHOLDER_PALETTE[index]
+    fg = _PLACEHOLDER_ACCENT[index]
     label_text = escape_xml(label or "model")
     prompt_text = escape_xml(prompt or "mock image")
     return (
@@ -59,82 +95,122 @@ def placeholder_svg(label: str, prompt: str, size: int = 512) -> str:
     )
 
 
-def collect_reference_images(references: Sequence[ImageReference]) -> list[str]:
+def _max_reference_px() -> int:
+    value = os.environ.get(MAX_REFERENCE_PX_ENV)
+    if not value:
+        return DEFAULT_MAX_REFERENCE_PX
+    try:
+        return int(value)
+    except ValueError:
+        return DEFAULT_MAX_REFERENCE_PX
+
+
+def _bound_reference_image(data_url: str, max_px: int) -> str:
+    header, separator, payload = data_url.partition(",")
+    if not separator or not header.startswith("data:image/") or ";base64" not in header:
+        return data_url
+    try:
+        with Image.open(io.BytesIO(pybase64.b64decode(payload))) as source:
+            if max(source.size) <= max_px:
+                return data_url
+            # The re-encoded copy carries no EXIF, so bake the orientation in.
+            image = ImageOps.exif_transpose(source)
+            buffer = io.BytesIO()
+            # JPEG sources stay JPEG; everything else (PNG screenshots
+            # included) stays lossless as PNG.
+            if source.format == "JPEG":
+                if image.mode not in ("RGB", "L", "CMYK"):
+                    image = image.convert("RGB")
+                image.thumbnail((max_px, max_px), Image.Resampling.LANCZOS)
+                image.save(buffer, format="JPEG", quality=85)
+                mime_type = "image/jpeg"
+            else:
+                if image.mode not in ("RGB", "RGBA", "L", "LA"):
+                    image = image.convert("RGBA")
+                image.thumbnail((max_px, max_px), Image.Resampling.LANCZOS)
+                image.save(buffer, format="PNG")
+                mime_type = "image/png"
+    except (OSError, ValueError, Image.DecompressionBombError):
+        return data_url
+    return image_bytes_to_data_url(buffer.getvalue(), mime_type)
+
+
+def collect_reference_images(
+    references: Sequence[ImageReference],
+) -> tuple[str, ...]:
+    # Oversized references are downscaled once per request; the tuple is
+    # shared read-only by every provider call in a batch.
+    max_px = _max_reference_px()
     images: list[str] = []
     for ref in references:
         data_url = (ref.data_url or "").strip()
-        if data_url:
-            images.append(data_url)
-    return images
+        if not data_url:
+            continue
+        if max_px > 0:
+            data_url = _bound_reference_image(data_url, max_px)
+        images.append(data_url)
+    return tuple(images)
+
+
+def _requested_size(value: str | None) -> str:
+    return str(value).strip().lower() if value else ""
 
 
 def resolve_size(value: str | None) -> int:
-    size = 512
-    if not value:
-        return size
-    requested_size = str(value).lower()
-    if "x" in requested_size:
-        try:
-            size = int(requested_size.split("x")[0])
-        except ValueError:
-            size = 512
-    else:
-        try:
-            size = int(requested_size)
-        except ValueError:
-            size = 512
-    return size
+    # "1024x768" -> 1024, "1024" -> 1024; anything else falls back to 512
+    # without raising and catching ValueError.
+    match = _SIZE_WIDTH_RE.match(_requested_size(value))
+    return int(match.group(1)) if match else 512
 
 
-def resolve_seedream_size(value: str | None) -> str:
-    if not value:
-        return "2048x2048"
-    requested = str(value).strip()
-    if not requested:
-        return "2048x2048"
-    lowered = requested.lower()
-    if lowered in {"2k", "4k"}:
-        return lowered.upper()
+def _resolve_size_pair(lowered: str, default: str) -> str:
     if "x" in lowered:
         return lowered
     if lowered.isdigit():
         return f"{lowered}x{lowered}"
-    return "2048x2048"
+    return default
+
+
+def resolve_seedream_size(value: str | None) -> str:
+    lowered = _requested_size(value)
+    if lowered in {"2k", "4k"}:
+        return lowered.upper()
+    return _resolve_size_pair(lowered, "2048x2048")
 
 
 def resolve_gpt_image_size(value: str | None) -> str:
-    if not value:
-        return "1024x1024"
-    requested = str(value).strip()
-    if not requested:
-        return "1024x1024"
-    lowered = requested.lower()
-    if "x" in lowered:
-        return lowered
-    if lowered.isdigit():
-        return f"{lowered}x{lowered}"
-    return "1024x1024"
+    return _resolve_size_pair(_requested_size(value), "1024x1024")
 
 
 def normalize_base_url(base_url: str) -> str:
     return base_url.rstrip("/")
 
 
+@lru_cache(maxsize=32)
 def resolve_seedream_base_url(base_url: str) -> str:
     base = normalize_base_url(base_url or "")
     if not base:
         return DEFAULT_SEEDREAM_BASE_URL
-    if base.endswith("/images/generations"):
-        return base.rsplit("/images/generations", 1)[0]
+    if base.endswith(_IMAGES_ENDPOINT):
+        return base[: -len(_IMAGES_ENDPOINT)]
     return base
 
 
+@lru_cache(maxsize=32)
 def resolve_openai_base_url(base_url: str) -> str | None:
     base = normalize_base_url(base_url or "")
     if not base:
         return None
-    if base.endswith("/images/generations"):
-        return base.rsplit("/images/generations", 1)[0]
+    if base.endswith(_IMAGES_ENDPOINT):
+        return base[: -len(_IMAGES_ENDPOINT)]
+    if base.startswith(("https://", "http://")) and not any(
+        ch in base for ch in "?#;\t\r\n"
+    ):
+        # Plain http(s)://host[/path]: nothing urlparse would strip or split
+        # off, so the path check is a string scan.
+        if "/" in base.partition("://")[2]:
+            return base
+        return f"{base}/v1"
     parsed = urlparse(base)
     path = parsed.path or ""
     if not path or path == "/":
@@ -143,57 +219,95 @@ def resolve_openai_base_url(base_url: str) -> str | None:
     return base
 
 
+class _ProviderFacts(NamedTuple):
+    provider: str
+    base_url: str
+    model_id: str
+    seedream: bool
+    aihubmix: bool
+    dashscope: bool
+
+
+@lru_cache(maxsize=256)
+def _provider_hint_groups(lowered_provider: str) -> frozenset[str]:
+    # Provider names come from a handful of saved configs, so every hint
+    # group is scanned once per name and later checks are set lookups.
+    return frozenset(
+        group
+        for group, hints in _PROVIDER_HINT_GROUPS
+        if any(token in lowered_provider for token in hints)
+    )
+
+
+@lru_cache(maxsize=64)
+def _provider_facts(provider: str, base_url: str, model_id: str) -> _ProviderFacts:
+    # Generation classifies the same provider/base/model triple several times
+    # per request; lowercase and scan the hint lists once per distinct triple.
+    provider = (provider or "").lower()
+    base_url = (base_url or "").lower()
+    model_id = (model_id or "").lower()
+    groups = _provider_hint_groups(provider)
+    return _ProviderFacts(
+        provider=provider,
+        base_url=base_url,
+        model_id=model_id,
+        seedream=(
+            "seedream" in model_id
+            or "seededit" in model_id
+            or "volces.com" in base_url
+            or "ark" in base_url
+            or "seedream" in groups
+        ),
+        aihubmix=(
+            "aihubmix" in groups
+            or "aihubmix.com" in base_url
+        ),
+        dashscope=(
+            "dashscope" in base_url
+            or "aliyuncs.com" in base_url
+            or "qwen" in model_id
+            or "dashscope" in groups
+        ),
+    )
+
+
 def is_seedream_provider(provider: str, base_url: str, model_id: str) -> bool:
-    lowered_provider = (provider or "").lower()
-    lowered_base = (base_url or "").lower()
-    lowered_model = (model_id or "").lower()
-    if "seedream" in lowered_model or "seededit" in lowered_model:
-        return True
-    if "volces.com" in lowered_base or "ark" in lowered_base:
-        return True
-    return any(token in lowered_provider for token in SEEDREAM_PROVIDER_HINTS)
+    return _provider_facts(provider, base_url, model_id).seedream
 
 
 def is_aihubmix_provider(provider: str, base_url: str) -> bool:
-    lowered_provider = (provider or "").lower()
-    lowered_base = (base_url or "").lower()
-    if any(token in lowered_provider for token in AIHUBMIX_PROVIDER_HINTS):
-        return True
-    return "aihubmix.com" in lowered_base
+    return _provider_facts(provider, base_url, "").aihubmix
 
 
 def is_dashscope_provider(provider: str, base_url: str, model_id: str) -> bool:
-    lowered_provider = (provider or "").lower()
-    lowered_base = (base_url or "").lower()
-    lowered_model = (model_id or "").lower()
-    if "dashscope" in lowered_base or "aliyuncs.com" in lowered_base:
-        return True
-    if "qwen" in lowered_model:
-        return True
-    return any(token in lowered_provider for token in DASHSCOPE_PROVIDER_HINTS)
+    return _provider_facts(provider, base_url, model_id).dashscope
 
 
+@lru_cache(maxsize=64)
 def resolve_default_base_url(provider: str, model_id: str) -> str | None:
-    lowered_provider = (provider or "").lower()
-    lowered_model = (model_id or "").lower()
+    facts = _provider_facts(provider, "", model_id)
+    groups = _provider_hint_groups(facts.provider)
+    lowered_model = facts.model_id
 
-    if is_seedream_provider(provider, "", model_id):
+    if facts.seedream:
         return DEFAULT_SEEDREAM_BASE_URL
-    if any(token in lowered_provider for token in AIHUBMIX_PROVIDER_HINTS):
+    if "aihubmix" in groups:
         return DEFAULT_AIHUBMIX_BASE_URL
-    if any(token in lowered_provider for token in GEMINI_PROVIDER_HINTS) or "nano-banana" in lowered_model:
+    if "gemini" in groups or "nano-banana" in lowered_model:
         return DEFAULT_GEMINI_BASE_URL
-    if any(token in lowered_provider for token in DASHSCOPE_PROVIDER_HINTS) or "qwen" in lowered_model:
+    if "dashscope" in groups or "qwen" in lowered_model:
         return DEFAULT_DASHSCOPE_BASE_URL
-    if any(token in lowered_provider for token in OPENAI_PROVIDER_HINTS) or lowered_model.startswith("gpt-"):
+    if "openai" in groups or lowered_model.startswith("gpt-"):
         return DEFAULT_OPENAI_BASE_URL
 
     return None
 
 
+@lru_cache(maxsize=64)
 def resolve_provider_name(model_id: str) -> str | None:
-    lowered_model = (model_id or "").lower()
-    if is_seedream_provider("", "", model_id):
+    facts = _provider_facts("", "", model_id)
+    lowered_model = facts.model_id
+    if facts.seedream:
         return "Volcengine Ark"
     if lowered_model == "gemini-3-pro-image-preview":
         return "AIHubMix"
@@ -206,10 +320,13 @@ def resolve_provider_name(model_id: str) -> str | None:
     return None
 
 
+@lru_cache(maxsize=64)
 def resolve_provider_model_id(provider_name: str, model_id: str) -> str:
-    lowered_provider = (provider_name or "").lower()
-    lowered_model = (model_id or "").lower()
-    if any(token in lowered_provider for token in VOLCENGINE_PROVIDER_HINTS):
+    facts = _provider_facts(provider_name, "", model_id)
+    lowered_provider = facts.provider
+    lowered_model = facts.model_id
+    groups = _provider_hint_groups(lowered_provider)
+    if "volcengine" in groups:
         mapped = VOLCENGINE_MODEL_ALIASES.get(lowered_model)
         if mapped:
             return mapped
@@ -218,7 +335,7 @@ def resolve_provider_model_id(provider_name: str, model_id: str) -> str:
             return "gemini-2.5-flash-image"
         if lowered_model == "nano-banana-pro":
             return "gemini-3-pro-image-preview"
-    if any(token in lowered_provider for token in AIHUBMIX_PROVIDER_HINTS):
+    if "aihubmix" in groups:
         if lowered_model == "nano-banana":
             return "gemini-2.5-flash-image"
         if lowered_model == "nano-banana-pro":
@@ -239,34 +356,142 @@ def debug_log(message: str, payload: dict[str, Any] | None = None) -> None:
     if os.getenv("DEBUG") != "true":
         return
     if payload:
-        print(f"[paraimage] {message} | {payload}")
+        encoded = orjson.dumps(
+            payload, default=str, option=orjson.OPT_NON_STR_KEYS
+        ).decode()
+        print(f"[paraimage] {message} | {encoded}")
     else:
         print(f"[paraimage] {message}")
 
 
-def extract_image_from_response(
+def as_dict(value: object) -> dict:
+    """Return an SDK response object as a plain dict for key lookups."""
+    if isinstance(value, dict):
+        return value
+    model_dump = getattr(value, "model_dump", None)
+    if callable(model_dump):
+        return model_dump()
+    return getattr(value, "__dict__", None) or {}
+
+
+@lru_cache(maxsize=4)
+def _http_pool(proxy_url: str | None) -> urllib3.PoolManager:
+    options = {
+        "num_pools": 8,
+        "maxsize": 16,
+        "retries": urllib3.Retry(2),
+        "timeout": urllib3.Timeout(connect=3, read=15),
+    }
+    if proxy_url:
+        return urllib3.ProxyManager(proxy_url, **options)
+    return urllib3.PoolManager(**options)
+
+
+def http_pool(url: str) -> urllib3.PoolManager:
+    """Shared keep-alive pool for url, honoring the system proxy settings."""
+    parsed = urlparse(url)
+    proxy_url = getproxies().get(parsed.scheme)
+    if proxy_url and parsed.hostname and proxy_bypass(parsed.hostname):
+        proxy_url = None
+    return _http_pool(proxy_url)
+
+
+def http_get(url: str) -> tuple[bytes | None, str | None]:
+    """GET over a shared keep-alive pool; returns (body, content type)."""
+    try:
+        response = http_pool(url).request("GET", url)
+    except (urllib3.exceptions.HTTPError, ValueError):
+        return None, None
+    if response.status >= 400:
+        return None, None
+    content_type = response.headers.get("Content-Type")
+    if content_type:
+        content_type = content_type.split(";", 1)[0].strip().lower() or None
+    return response.data, content_type
+
+
+def read_local_file(path: str) -> bytes:
+    with open(path, "rb") as handle:
+        return handle.read()
+
+
+def _image_file_output_enabled() -> bool:
+    value = os.environ.get(IMAGE_FILE_OUTPUT_ENV)
+    if value is None:
+        return False
+    return value.strip().lower() in {"1", "true", "yes", "on"}
+
+
+def image_bytes_to_data_url(data: bytes | bytearray, mime_type: str) -> str:
+    data_url = b"data:%s;base64,%s" % (
+        mime_type.encode("ascii"),
+        pybase64.b64encode(data),
+    )
+    return data_url.decode("ascii")
+
+
+def _write_generated_image(data: bytes | bytearray, mime_type: str) -> str:
+    GENERATED_IMAGES_DIR.mkdir(parents=True, exist_ok=True)
+    extension = GENERATED_IMAGE_EXTENSIONS.get(mime_type, ".png")
+    path = GENERATED_IMAGES_DIR / f"{uuid4().hex}{extension}"
+    path.write_bytes(data)
+    return path.as_uri()
+
+
+def image_bytes_to_url(data: bytes | bytearray, mime_type: str) -> str:
+    """Return generated image bytes as a URL the frontend can display.
+
+    With PARAIMAGE_IMAGE_FILE_OUTPUT enabled the bytes are written under the
+    data dir and a file:// URL is returned, keeping multi-megabyte base64
+    strings off the js_api bridge and out of saved chat history. Only
+    provider results go through here; references sent to providers must
+    stay data URLs (see image_bytes_to_data_url).
+    """
+    if _image_file_output_enabled():
+        return _write_generated_image(data, mime_type)
+    return image_bytes_to_data_url(data, mime_type)
+
+
+def b64_image_to_url(b64_data: str, mime_type: str) -> str:
+    """Like image_bytes_to_url, for results a provider returned as base64."""
+    if _image_file_output_enabled():
+        try:
+            return _write_generated_image(
+                pybase64.b64decode(b64_data, validate=False), mime_type
+            )
+        except ValueError:
+            pass
+    return f"data:{mime_type};base64,{b64_data}"
+
+
+def extract_images_from_response(
     data: Any,
     *,
     mime_type: str,
-) -> tuple[str | None, str | None]:
-    if isinstance(data, dict) and data.get("error"):
-        return None, str(data.get("error"))
-
-    results = data.get("data") if isinstance(data, dict) else getattr(data, "data", None)
+) -> tuple[list[str] | None, str | None]:
+    if isinstance(data, dict):
+        error = data.get("error")
+        if error:
+            return None, str(error)
+        results = data.get("data")
+    else:
+        results = getattr(data, "data", None)
     if not results:
         return None, "no image data returned"
 
-    first = results[0] if isinstance(results, list) else results
-    if isinstance(first, dict):
-        b64_json = first.get("b64_json") or first.get("b64Json")
-        url = first.get("url")
-    else:
-        b64_json = getattr(first, "b64_json", None)
-        url = getattr(first, "url", None)
-
-    if b64_json:
-        return f"data:{mime_type};base64,{b64_json}", None
-    if url:
-        return url, None
-
-    return None, "unknown image response format"
+    images: list[str] = []
+    for item in results if isinstance(results, list) else [results]:
+        if isinstance(item, dict):
+            b64_json = item.get("b64_json") or item.get("b64Json")
+            url = item.get("url")
+        else:
+            b64_json = getattr(item, "b64_json", None)
+            url = getattr(item, "url", None)
+        if b64_json:
+            images.append(b64_image_to_url(b64_json, mime_type))
+        elif url:
+            images.append(url)
+
+    if not images:
+        return None, "unknown image response format"
+    return images, None
@@ -0,0 +1,12 @@
+from __future__ import annotations
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# storage resolves DATA_DIR at import time, so point it at a scratch
+# directory before any test module imports it.
+os.environ["PARAIMAGE_DATA_DIR"] = tempfile.mkdtemp(prefix="paraimage-tests-")
+os.environ["PARAIMAGE_STARTUP_TERMINAL"] = "0"
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
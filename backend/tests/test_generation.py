@@ -0,0 +1,49 @@
+from __future__ import annotations
+
+from providers.openai_provider import MAX_IMAGES_PER_REQUEST
+from services.generation import _GenerationTarget, _plan_batch_jobs
+
+
+def _target(model_id: str, kind: str) -> _GenerationTarget:
+    return _GenerationTarget(
+        model_id=model_id,
+        provider_name="provider",
+        provider_model_id=model_id,
+        api_key="key",
+        base_url=None,
+        kind=kind,
+    )
+
+
+GPT_IMAGE = _target("gpt-image-1", "openai")
+DALLE = _target("dall-e-3", "openai")
+GEMINI = _target("gemini", "gemini")
+
+
+def test_multi_image_target_repeats_share_a_request():
+    jobs = _plan_batch_jobs([(GPT_IMAGE, None), (DALLE, None), (GPT_IMAGE, None)])
+    assert [(job.target, job.indices, job.count) for job in jobs] == [
+        (GPT_IMAGE, [0, 2], 2),
+        (DALLE, [1], 1),
+    ]
+
+
+def test_multi_image_jobs_are_capped_per_request():
+    slots = MAX_IMAGES_PER_REQUEST + 3
+    jobs = _plan_batch_jobs([(GPT_IMAGE, None)] * slots)
+    assert [job.count for job in jobs] == [MAX_IMAGES_PER_REQUEST, 3]
+    assert [index for job in jobs for index in job.indices] == list(range(slots))
+
+
+def test_each_slot_of_a_single_image_target_gets_its_own_job():
+    jobs = _plan_batch_jobs([(DALLE, None), (GEMINI, None), (DALLE, None)])
+    assert [(job.target, job.indices, job.count) for job in jobs] == [
+        (DALLE, [0], 1),
+        (GEMINI, [1], 1),
+        (DALLE, [2], 1),
+    ]
+
+
+def test_unresolved_slots_are_skipped():
+    jobs = _plan_batch_jobs([(None, "provider not found"), (DALLE, None)])
+    assert [(job.indices, job.count) for job in jobs] == [([1], 1)]
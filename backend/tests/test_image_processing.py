@@ -0,0 +1,71 @@
+from __future__ import annotations
+
+import io
+
+import pybase64
+import pytest
+from PIL import Image
+
+from services.image_processing import process_images
+
+
+def _png_data_url(image: Image.Image) -> str:
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return "data:image/png;base64," + pybase64.b64encode_as_string(buffer.getvalue())
+
+
+def _decode(data_url: str) -> Image.Image:
+    header, _, payload = data_url.partition(",")
+    assert header == "data:image/png;base64"
+    image = Image.open(io.BytesIO(pybase64.b64decode(payload)))
+    image.load()
+    return image
+
+
+def _split(image_url: str, rows: int, cols: int) -> dict:
+    response = process_images(
+        {
+            "action": "split",
+            "rows": rows,
+            "cols": cols,
+            "images": [{"id": "a", "imageUrl": image_url}],
+        }
+    )
+    assert response["ok"]
+    return response["results"][0]
+
+
+@pytest.mark.parametrize("mode", ["RGBA", "RGB", "L", "P"])
+@pytest.mark.parametrize("grid", [(1, 1), (2, 3)])
+def test_split_tiles_round_trip_as_rgba(mode, grid):
+    rows, cols = grid
+    source = Image.new("RGBA", (30, 20))
+    for x in range(30):
+        for y in range(20):
+            source.putpixel((x, y), (x * 8, y * 12, (x + y) * 5, 255))
+    source = source.convert(mode)
+
+    result = _split(_png_data_url(source), rows, cols)
+
+    tiles = [_decode(url) for url in result["images"]]
+    assert len(tiles) == rows * cols
+    assert all(tile.mode == "RGBA" for tile in tiles)
+    expected = source.convert("RGBA")
+    tile_width, tile_height = 30 // cols, 20 // rows
+    for index, tile in enumerate(tiles):
+        row, col = divmod(index, cols)
+        box = (
+            col * tile_width,
+            row * tile_height,
+            (col + 1) * tile_width,
+            (row + 1) * tile_height,
+        )
+        assert tile.tobytes() == expected.crop(box).tobytes()
+
+
+@pytest.mark.parametrize("grid", [(1, 1), (2, 2)])
+def test_split_reports_undecodable_png(grid):
+    result = _split("data:image/png;base64,AAAA", *grid)
+    assert "images" not in result
+    assert "cannot identify image file" in result["error"]
@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+import orjson
+import pytest
+
+import storage
+from storage import (
+    ChatMessage,
+    ChatSession,
+    _MESSAGE_COMPRESS_MIN,
+    _MESSAGE_RAW,
+    _MESSAGE_ZLIB,
+    _connection,
+    _decode_message,
+    _encode_message,
+    database,
+    init_db,
+)
+
+
+@pytest.fixture
+def fresh_db():
+    database.close_all()
+    for suffix in ("", "-wal", "-shm"):
+        storage.DB_PATH.with_name(storage.DB_PATH.name + suffix).unlink(
+            missing_ok=True
+        )
+    init_db()
+    yield
+    database.close_all()
+
+
+def test_small_message_is_stored_raw():
+    raw = orjson.dumps({"role": "user", "content": "hi"})
+    encoded = _encode_message(raw)
+    assert encoded[:1] == _MESSAGE_RAW
+    assert encoded[1:] == raw
+    assert _decode_message(encoded) == {"role": "user", "content": "hi"}
+
+
+def test_large_message_is_deflated():
+    message = {"role": "assistant", "content": "x" * (_MESSAGE_COMPRESS_MIN * 4)}
+    raw = orjson.dumps(message)
+    encoded = _encode_message(raw)
+    assert encoded[:1] == _MESSAGE_ZLIB
+    assert len(encoded) < len(raw)
+    assert _decode_message(encoded) == message
+
+
+def test_legacy_text_payload_still_decodes():
+    assert _decode_message('{"role": "user"}') == {"role": "user"}
+
+
+def test_messages_round_trip_through_storage(fresh_db):
+    messages = [
+        {"role": "user", "content": "short"},
+        {"role": "assistant", "content": "y" * (_MESSAGE_COMPRESS_MIN * 2)},
+    ]
+    storage.upsert_chat_session("s1", "m1", "title", messages)
+    with _connection():
+        record = ChatSession.get(ChatSession.session_id == "s1")
+    assert record.get_messages() == messages
+
+
+def _schema_version() -> int:
+    with _connection():
+        return database.execute_sql("PRAGMA user_version").fetchone()[0]
+
+
+def _write_legacy_session(session_id: str, messages: list[dict]) -> None:
+    with _connection():
+        ChatSession.insert(
+            session_id=session_id,
+            model_id="m1",
+            messages=orjson.dumps(messages).decode(),
+        ).execute()
+
+
+def _stored_messages(session_id: str) -> list[object]:
+    with _connection():
+        rows = (
+            ChatMessage.select(ChatMessage.payload)
+            .where(ChatMessage.session_id == session_id)
+            .order_by(ChatMessage.seq)
+            .tuples()
+        )
+        return [_decode_message(payload) for (payload,) in rows]
+
+
+def _legacy_column(session_id: str) -> str:
+    with _connection():
+        return (
+            ChatSession.select(ChatSession.messages)
+            .where(ChatSession.session_id == session_id)
+            .scalar()
+        )
+
+
+def test_inline_messages_are_copied_once_and_column_kept(fresh_db):
+    messages = [{"role": "user", "content": "legacy"}]
+    _write_legacy_session("legacy", messages)
+    with _connection():
+        database.execute_sql("PRAGMA user_version = 1")
+
+    init_db()
+
+    assert _stored_messages("legacy") == messages
+    assert orjson.loads(_legacy_column("legacy")) == messages
+    assert _schema_version() == storage._SCHEMA_VERSION
+
+    # Already migrated: a later start must not copy the column again.
+    with _connection():
+        ChatSession.update(messages='[{"role": "user", "content": "stale"}]').where(
+            ChatSession.session_id == "legacy"
+        ).execute()
+    init_db()
+
+    assert _stored_messages("legacy") == messages
+
+
+@pytest.mark.parametrize("returning_clause", [True, False])
+def test_upsert_does_not_read_back_legacy_messages(
+    fresh_db, monkeypatch, returning_clause
+):
+    monkeypatch.setattr(database, "returning_clause", returning_clause)
+    messages = [{"role": "user", "content": "legacy"}]
+    _write_legacy_session("legacy", messages)
+
+    record = storage.upsert_chat_session("legacy", "m1", "renamed", messages)
+
+    assert record.title == "renamed"
+    assert "messages" not in record.__data__
+    assert record.get_messages() == messages
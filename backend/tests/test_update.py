@@ -0,0 +1,272 @@
+from __future__ import annotations
+
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import orjson
+import pytest
+
+from services import update
+
+RELEASE = {"tag_name": "v9.0.0", "assets": []}
+RELEASE_ETAG = '"release-1"'
+
+
+class _Server:
+    """Local stand-in for the GitHub API and asset host."""
+
+    def __init__(self) -> None:
+        self.requests: list[tuple[str, str, dict[str, str]]] = []
+        self.release = RELEASE
+        self.release_etag = RELEASE_ETAG
+        self.asset = b""
+        self.asset_etag = '"asset-1"'
+        self.base_url = ""
+
+    def handle(self, handler: BaseHTTPRequestHandler) -> None:
+        headers = dict(handler.headers.items())
+        self.requests.append((handler.command, handler.path, headers))
+        if handler.path.endswith("/releases/latest"):
+            self._send_release(handler, headers)
+        else:
+            self._send_asset(handler, headers)
+
+    def _send_release(self, handler, headers) -> None:
+        if headers.get("If-None-Match") == self.release_etag:
+            handler.send_response(304)
+            handler.send_header("ETag", self.release_etag)
+            handler.end_headers()
+            return
+        body = orjson.dumps(self.release)
+        handler.send_response(200)
+        handler.send_header("ETag", self.release_etag)
+        handler.send_header("Content-Length", str(len(body)))
+        handler.end_headers()
+        handler.wfile.write(body)
+
+    def _send_asset(self, handler, headers) -> None:
+        asset = self.asset
+        requested = headers.get("Range")
+        if_range = headers.get("If-Range")
+        status, body = 200, asset
+        if requested and if_range in (None, self.asset_etag):
+            start = int(requested.removeprefix("bytes=").rstrip("-"))
+            if start >= len(asset):
+                handler.send_response(416)
+                handler.send_header("Content-Length", "0")
+                handler.end_headers()
+                return
+            status, body = 206, asset[start:]
+        handler.send_response(status)
+        if status == 206:
+            handler.send_header(
+                "Content-Range", f"bytes {start}-{len(asset) - 1}/{len(asset)}"
+            )
+        handler.send_header("ETag", self.asset_etag)
+        handler.send_header("Content-Length", str(len(body)))
+        handler.end_headers()
+        if handler.command != "HEAD":
+            handler.wfile.write(body)
+
+    def asset_requests(self) -> list[tuple[str | None, str | None]]:
+        return [
+            (headers.get("Range"), headers.get("If-Range"))
+            for command, path, headers in self.requests
+            if command == "GET" and not path.endswith("/releases/latest")
+        ]
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    state = _Server()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args) -> None:
+            pass
+
+        def do_GET(self) -> None:
+            state.handle(self)
+
+        def do_HEAD(self) -> None:
+            state.handle(self)
+
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(
+        target=httpd.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True
+    )
+    thread.start()
+    state.base_url = f"http://127.0.0.1:{httpd.server_port}"
+    monkeypatch.setattr(update, "_GITHUB_API_BASE", state.base_url)
+    monkeypatch.setattr(
+        update, "_RELEASE_CACHE_PATH", tmp_path / "update_cache.json"
+    )
+    yield state
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def _release_headers(server: _Server) -> list[dict[str, str]]:
+    return [
+        headers
+        for _, path, headers in server.requests
+        if path.endswith("/releases/latest")
+    ]
+
+
+def test_release_check_revalidates_with_the_cached_etag(server):
+    first, error = update._fetch_latest_release()
+    assert error is None
+    assert first == RELEASE
+
+    second, error = update._fetch_latest_release()
+    assert error is None
+    assert second == RELEASE
+
+    sent = _release_headers(server)
+    assert len(sent) == 2
+    assert "If-None-Match" not in sent[0]
+    assert sent[1]["If-None-Match"] == RELEASE_ETAG
+
+
+def test_changed_release_replaces_the_cache(server):
+    update._fetch_latest_release()
+    server.release = {"tag_name": "v9.1.0", "assets": []}
+    server.release_etag = '"release-2"'
+
+    payload, error = update._fetch_latest_release()
+
+    assert error is None
+    assert payload["tag_name"] == "v9.1.0"
+    cached = orjson.loads(update._RELEASE_CACHE_PATH.read_bytes())
+    assert cached["etag"] == '"release-2"'
+    assert cached["payload"] == server.release
+
+
+ASSET = bytes(range(256)) * 1200
+
+
+def _download(server: _Server, tmp_path, expected_digest=None):
+    server.asset = ASSET
+    target = tmp_path / "paraimage.zip"
+    result = update._download_asset(
+        f"{server.base_url}/asset.zip", target, expected_digest
+    )
+    return result, target
+
+
+def _leave_partial(tmp_path, data: bytes, validator: str | None) -> None:
+    (tmp_path / ".paraimage.zip.part").write_bytes(data)
+    if validator is not None:
+        (tmp_path / ".paraimage.zip.part.validator").write_text(validator)
+
+
+def _no_partial_left(tmp_path) -> bool:
+    return not (tmp_path / ".paraimage.zip.part").exists() and not (
+        tmp_path / ".paraimage.zip.part.validator"
+    ).exists()
+
+
+def test_fresh_download_writes_the_whole_asset(server, tmp_path):
+    result, target = _download(server, tmp_path)
+
+    assert result["ok"]
+    assert target.read_bytes() == ASSET
+    assert server.asset_requests() == [(None, None)]
+    assert _no_partial_left(tmp_path)
+
+
+def test_partial_of_the_same_asset_is_resumed(server, tmp_path):
+    _leave_partial(tmp_path, ASSET[:1000], server.asset_etag)
+
+    result, target = _download(server, tmp_path)
+
+    assert result["ok"]
+    assert target.read_bytes() == ASSET
+    assert server.asset_requests() == [("bytes=1000-", server.asset_etag)]
+    assert _no_partial_left(tmp_path)
+
+
+def test_partial_of_an_older_asset_restarts_from_zero(server, tmp_path):
+    _leave_partial(tmp_path, b"x" * 1000, '"asset-0"')
+
+    result, target = _download(server, tmp_path)
+
+    assert result["ok"]
+    assert target.read_bytes() == ASSET
+    assert server.asset_requests() == [("bytes=1000-", '"asset-0"')]
+
+
+def test_partial_without_validator_is_not_resumed(server, tmp_path):
+    _leave_partial(tmp_path, ASSET[:1000], None)
+
+    result, target = _download(server, tmp_path)
+
+    assert result["ok"]
+    assert target.read_bytes() == ASSET
+    assert server.asset_requests() == [(None, None)]
+
+
+def test_unsatisfiable_range_retries_once_from_zero(server, tmp_path):
+    _leave_partial(tmp_path, b"y" * (len(ASSET) + 10), server.asset_etag)
+
+    result, target = _download(server, tmp_path)
+
+    assert result["ok"]
+    assert target.read_bytes() == ASSET
+    assert server.asset_requests() == [
+        (f"bytes={len(ASSET) + 10}-", server.asset_etag),
+        (None, None),
+    ]
+
+
+ASSET_SHA256 = hashlib.sha256(ASSET).hexdigest()
+
+
+def test_download_matching_the_published_sha256_succeeds(server, tmp_path):
+    result, target = _download(server, tmp_path, ASSET_SHA256)
+
+    assert result["ok"]
+    assert target.read_bytes() == ASSET
+
+
+def test_resumed_download_is_hashed_from_the_start(server, tmp_path):
+    _leave_partial(tmp_path, ASSET[:1000], server.asset_etag)
+
+    result, target = _download(server, tmp_path, ASSET_SHA256)
+
+    assert result["ok"]
+    assert server.asset_requests() == [("bytes=1000-", server.asset_etag)]
+    assert target.read_bytes() == ASSET
+
+
+def test_sha256_mismatch_fails_and_discards_the_partial(server, tmp_path):
+    _leave_partial(tmp_path, b"z" * 1000, server.asset_etag)
+
+    result, target = _download(server, tmp_path, ASSET_SHA256)
+
+    assert not result["ok"]
+    assert "sha256" in result["error"]
+    assert not target.exists()
+    assert _no_partial_left(tmp_path)
+
+
+def test_published_digest_comes_from_the_cached_release(server):
+    asset_url = f"{server.base_url}/asset.zip"
+    server.release = {
+        "tag_name": "v9.0.0",
+        "assets": [
+            {
+                "browser_download_url": asset_url,
+                "digest": f"sha256:{ASSET_SHA256.upper()}",
+            },
+            {"browser_download_url": f"{server.base_url}/other.zip"},
+        ],
+    }
+    update._fetch_latest_release()
+
+    assert update._published_digest(asset_url) == ASSET_SHA256
+    assert update._published_digest(f"{server.base_url}/other.zip") is None
+    assert update._published_digest(f"{server.base_url}/missing.zip") is None